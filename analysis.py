@@ -0,0 +1,222 @@
+"""Cycle time regression detection over Product_Benchmark."""
+
+import warnings
+from collections import namedtuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from issa import DB_FILE, BenchmarkTable, ProductBenchmarkTable, serial_conditions
+
+
+Regression = namedtuple("Regression", [
+    "benchmark_id", "step", "samples", "baseline_median", "recent_median",
+    "change", "z_score", "change_point_serial"])
+
+
+class CycleTimes:
+    """
+    A class to represent the step durations of many units as columnar NumPy arrays.
+
+    Durations are laid out as a (steps x units) matrix, one row per benchmark_id, each
+    row right aligned in serial number order and padded with NaN on the left, so the
+    latest units of every step share the last columns and all the statistics are
+    computed for every step at once.
+
+    Attributes:
+        benchmark_ids   (ndarray): benchmark_id of every matrix row.
+        durations       (ndarray): (steps x units) durations, NaN padded.
+        units           (ndarray): (steps x units) index in serial_numbers, -1 padded.
+        serial_numbers  (ndarray): Sorted serial numbers.
+        counts          (ndarray): Number of samples of every step.
+
+    Methods:
+        load(since, until, product_type):
+            Loads the durations of a time range.
+        rolling_median(window):
+            Rolling median of every step.
+        regressions(window, threshold, z_threshold):
+            Steps whose recent cycle time regressed.
+    """
+    def __init__(self, benchmark_ids: np.ndarray, durations: np.ndarray, units: np.ndarray,
+                 serial_numbers: np.ndarray, db_file: str = DB_FILE) -> None:
+        self.db_file = db_file
+        self.serial_numbers = serial_numbers
+        order = np.lexsort((units, benchmark_ids))
+        ids, durations, units = benchmark_ids[order], durations[order], units[order]
+
+        self.benchmark_ids, starts, self.counts = np.unique(ids, return_index=True, return_counts=True)
+        width = int(self.counts.max()) if len(self.counts) else 0
+        rows = np.repeat(np.arange(len(starts)), self.counts)
+        cols = np.arange(len(ids)) - np.repeat(starts, self.counts) + np.repeat(width - self.counts, self.counts)
+
+        self.durations = np.full((len(starts), width), np.nan)
+        self.durations[rows, cols] = durations
+        self.units = np.full((len(starts), width), -1, dtype=np.int64)
+        self.units[rows, cols] = units
+
+
+    @classmethod
+    def load(cls, since: str = None, until: str = None, product_type: str = None,
+             db_file: str = DB_FILE) -> "CycleTimes":
+        """
+        Loads the durations of a time range.
+
+        Parameters
+            since           (str): First created_on, 'YYYY-MM-DD HH:MM:SS' UTC.
+            until           (str): Last created_on, excluded.
+            product_type    (str): Product type, every type if None.
+            db_file         (str): Path to the SQLite DB.
+
+        Returns
+            cycle_times (CycleTimes): Loaded durations.
+        """
+        table = ProductBenchmarkTable(db_file=db_file)
+        conditions, params = [], []
+        if since:
+            conditions.append("created_on >= ?")
+            params.append(since)
+        if until:
+            conditions.append("created_on < ?")
+            params.append(until)
+        where, type_params = next(serial_conditions("serial_number", product_type=product_type))
+        query = f"""
+            SELECT benchmark_id, duration_sec, serial_number
+            FROM {table.table_name}
+            WHERE {" AND ".join(conditions + [where])};
+        """
+        ids, durations, codes = [], [], []
+        serial_codes = {}
+        for rows in table.stream(query, tuple(params + type_params), chunk_size=50000):
+            chunk_ids, chunk_durations, chunk_serials = zip(*rows)
+            ids.append(np.array(chunk_ids, dtype=np.int64))
+            durations.append(np.array(chunk_durations, dtype=float))
+            # Rows of a unit are stored together, code every run of equal serials once.
+            chunk_serials = np.array(chunk_serials, dtype=str)
+            starts = np.flatnonzero(np.r_[True, chunk_serials[1:] != chunk_serials[:-1]])
+            run_codes = [serial_codes.setdefault(serial, len(serial_codes))
+                         for serial in chunk_serials[starts].tolist()]
+            codes.append(np.repeat(np.array(run_codes, dtype=np.int64), np.diff(np.r_[starts, len(chunk_serials)])))
+        if not ids:
+            return cls(np.empty(0, np.int64), np.empty(0), np.empty(0, np.int64), np.empty(0, str), db_file)
+
+        # Codes follow the arrival order, rank them in serial number order.
+        serial_numbers = np.array(list(serial_codes), dtype=str)
+        order = np.argsort(serial_numbers)
+        ranks = np.empty_like(order)
+        ranks[order] = np.arange(len(order))
+        units = ranks[np.concatenate(codes)]
+        return cls(np.concatenate(ids), np.concatenate(durations), units, serial_numbers[order], db_file)
+
+
+    def rolling_median(self, window: int = 20, max_cells: int = 8_000_000) -> np.ndarray:
+        """
+        Rolling median of every step.
+
+        Parameters
+            window      (int): Number of units per window.
+            max_cells   (int): Bounds the memory of the window views.
+
+        Returns
+            medians (ndarray): (steps x units - window + 1) medians, NaN until a step
+                               has window samples.
+        """
+        steps, width = self.durations.shape
+        if width < window:
+            return np.full((steps, 0), np.nan)
+        medians = np.empty((steps, width - window + 1))
+        rows = max(1, max_cells // (window * (width - window + 1)))
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            for start in range(0, steps, rows):
+                views = sliding_window_view(self.durations[start:start + rows], window, axis=1)
+                medians[start:start + rows] = np.median(views, axis=2)
+        return medians
+
+
+    def change_points(self) -> np.ndarray:
+        """
+        Most likely change point of every step (CUSUM of the deviations to the mean).
+
+        Returns
+            columns (ndarray): Column of the first unit after the change, per step.
+        """
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            means = np.nanmean(self.durations, axis=1, keepdims=True)
+        cusum = np.cumsum(np.nan_to_num(self.durations - means), axis=1)
+        return np.argmax(np.abs(cusum), axis=1) + 1
+
+
+    def regressions(self, window: int = 20, threshold: float = 0.1, z_threshold: float = 3.0) -> list:
+        """
+        Steps whose recent cycle time regressed.
+
+        The median of the last window units of every step is compared with the units
+        before them: a step regressed if it is more than threshold slower and its robust
+        z-score exceeds z_threshold. The z-score is the distance to the baseline median
+        in standard errors of a window median, estimated from the baseline MAD.
+
+        Parameters
+            window      (int): Number of recent units.
+            threshold   (float): Relative slow down, 0.1 = 10 %.
+            z_threshold (float): Min robust z-score.
+
+        Returns
+            regressions (list): Regression of every regressed step, worst first.
+        """
+        if self.durations.shape[1] <= window:
+            return []
+        recent = self.durations[:, -window:]
+        baseline = self.durations[:, :-window]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            recent_median = np.nanmedian(recent, axis=1)
+            baseline_median = np.nanmedian(baseline, axis=1)
+            mad = 1.4826 * np.nanmedian(np.abs(baseline - baseline_median[:, None]), axis=1)
+            change = recent_median / baseline_median - 1
+            # Standard error of the median of window samples.
+            error = 1.2533 * mad / np.sqrt(window)
+            z_score = (recent_median - baseline_median) / np.where(error > 0, error, np.nan)
+        enough = np.sum(~np.isnan(recent), axis=1) == window
+        regressed = enough & (change > threshold) & (np.nan_to_num(z_score, nan=np.inf) > z_threshold)
+
+        indexes = np.flatnonzero(regressed)
+        if not len(indexes):
+            return []
+        change_points = self.change_points()
+        names = {row_id: name for name, row_id in BenchmarkTable(db_file=self.db_file).fetch(
+            "SELECT name, id FROM Benchmark;") or []}
+        results = [Regression(
+            benchmark_id=int(self.benchmark_ids[i]),
+            step=names.get(int(self.benchmark_ids[i])),
+            samples=int(self.counts[i]),
+            baseline_median=float(baseline_median[i]),
+            recent_median=float(recent_median[i]),
+            change=float(change[i]),
+            z_score=float(z_score[i]),
+            change_point_serial=str(self.serial_numbers[self.units[i, min(change_points[i], self.units.shape[1] - 1)]]),
+        ) for i in indexes]
+        return sorted(results, key=lambda regression: regression.change, reverse=True)
+
+
+def find_regressions(since: str = None, until: str = None, product_type: str = None,
+                     window: int = 20, threshold: float = 0.1, z_threshold: float = 3.0,
+                     db_file: str = DB_FILE) -> list:
+    """
+    Loads a time range and returns the steps whose cycle time regressed.
+
+    Parameters
+        since           (str): First created_on, 'YYYY-MM-DD HH:MM:SS' UTC.
+        until           (str): Last created_on, excluded.
+        product_type    (str): Product type, every type if None.
+        window          (int): Number of recent units.
+        threshold       (float): Relative slow down, 0.1 = 10 %.
+        z_threshold     (float): Min robust z-score.
+        db_file         (str): Path to the SQLite DB.
+
+    Returns
+        regressions (list): Regression of every regressed step, worst first.
+    """
+    cycle_times = CycleTimes.load(since, until, product_type, db_file)
+    return cycle_times.regressions(window, threshold, z_threshold)
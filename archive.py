@@ -0,0 +1,437 @@
+"""Monthly archives of the Log table and incremental compaction of the hot DB."""
+
+import argparse
+import os
+import sqlite3
+import threading
+from sqlite3 import Error, OperationalError
+
+from config import get_settings
+from issa import DB_FILE, LogTable, serial_conditions
+
+ARCHIVE_ALIAS = "archive"
+
+
+class LogArchive:
+    """
+    A class to represent the archived months of a Log table.
+
+    Logs older than retention_days are moved, month by month, to one SQLite file per
+    month (<db name>_log_YYYY_MM.db in archive_dir). The hot DB keeps a catalog of the
+    archived months (Log_Partition) and of the serial numbers each one holds
+    (Log_Archive), so a serial number lookup only opens the months it needs. The
+    catalog keeps the absolute path of every month file: readers find them whatever
+    archive_dir they were built with, and a month keeps its file once archived.
+    Requires the schema version 4 (see migrations.py).
+
+    Attributes:
+        table           (LogTable): Hot Log table.
+        archive_dir     (str): Folder of the monthly files, <DB folder>/archive by default.
+        retention_days  (int): Age in days after which logs are archived.
+
+    Methods:
+        archive(batch_size):
+            Moves the logs older than retention_days to their monthly file.
+        compact(max_pages, pause):
+            Gives the free pages of the hot DB back to the file system, a few at a time.
+        iter_logs(serial_number, query, chunk_size):
+            Streams the archived logs of a serial number.
+        iter_window(start, end, query, chunk_size):
+            Streams the archived logs of a time window.
+        iter_selection(serial_numbers, serial_range, product_type, build_query, chunk_size):
+            Streams the archived logs of a product selection.
+        start(interval):
+            Archives and compacts in a background thread.
+        clear():
+            Deletes the monthly files and empties the catalog.
+    """
+    def __init__(self, table: LogTable = None, archive_dir: str = None, retention_days: int = None) -> None:
+        settings = get_settings()
+        self.table = table or LogTable()
+        self.archive_dir = archive_dir or settings.archive_dir \
+            or os.path.join(os.path.dirname(os.path.abspath(self.table.db_file)), "archive")
+        self.retention_days = settings.retention_days if retention_days is None else retention_days
+        self._stop = threading.Event()
+        self._thread = None
+
+
+    def partitions(self, serial_number: str) -> list:
+        """
+        Gets the archive files holding logs of a serial number.
+
+        Parameters
+            serial_number (str): Serial Number.
+
+        Returns
+            paths (list): Monthly file paths, oldest first.
+        """
+        query = '''
+        SELECT p.file
+        FROM Log_Archive a
+        JOIN Log_Partition p ON p.month = a.month
+        WHERE a.serial_number = ?
+        ORDER BY p.month;
+        '''
+        try:
+            with self.table.manager.reader() as conn:
+                files = conn.execute(query, (serial_number,)).fetchall()
+        except OperationalError:
+            # No catalog yet, nothing was archived.
+            return []
+        return [self._path(file) for file, in files]
+
+
+    def iter_logs(self, serial_number: str, query: str, chunk_size: int = 1000):
+        """
+        Streams the archived logs of a serial number.
+
+        Only the months holding the serial number are attached, read only, one at a
+        time, to an in-memory connection, the hot DB is not involved.
+
+        Parameters
+            serial_number   (str): Serial Number.
+            query           (str): Log query with one serial number parameter, reading
+                                   from archive.<table name>.
+            chunk_size      (int): Rows per chunk.
+
+        Yields
+            rows (list): Next chunk of archived log rows.
+        """
+        return self._iter_partitions(self.partitions(serial_number), query, (serial_number,), chunk_size)
+
+
+    def iter_window(self, start: str, end: str, query: str, chunk_size: int = 1000):
+        """
+        Streams the archived logs of a time window.
+
+        Only the months overlapping the window are attached.
+
+        Parameters
+            start       (str): First created_on, 'YYYY-MM-DD HH:MM:SS' UTC, open if None.
+            end         (str): End of the window, excluded, open if None.
+            query       (str): Log query with the start and end parameters given, reading
+                               from archive.<table name>.
+            chunk_size  (int): Rows per chunk.
+
+        Yields
+            rows (list): Next chunk of archived log rows.
+        """
+        query_months = '''
+        SELECT file
+        FROM Log_Partition
+        WHERE month >= substr(?, 1, 7) AND month <= substr(?, 1, 7)
+        ORDER BY month;
+        '''
+        try:
+            with self.table.manager.reader() as conn:
+                files = conn.execute(query_months, (start or "0000-00", end or "9999-99")).fetchall()
+        except OperationalError:
+            return iter(())
+        paths = [self._path(file) for file, in files]
+        params = tuple(value for value in (start, end) if value)
+        return self._iter_partitions(paths, query, params, chunk_size)
+
+
+    def iter_selection(self,
+                       serial_numbers: list = None,
+                       serial_range: tuple = None,
+                       product_type: str = None,
+                       build_query=None,
+                       chunk_size: int = 1000):
+        """
+        Streams the archived logs of a product selection, month by month.
+
+        The selection is resolved on the catalog of the hot DB, then every month is
+        queried with IN lists of its own serial numbers.
+
+        Parameters
+            serial_numbers  (list): Serial numbers.
+            serial_range    (tuple): (first, last) serial numbers, both included.
+            product_type    (str): Product type.
+            build_query     (callable): build_query(where) -> log query reading from
+                                        archive.<table name>, where selecting l.serial_number.
+            chunk_size      (int): Rows per chunk.
+
+        Yields
+            rows (list): Next chunk of archived log rows.
+        """
+        months = {}
+        try:
+            with self.table.manager.reader() as conn:
+                for where, params in serial_conditions("a.serial_number", serial_numbers, serial_range, product_type):
+                    for month, file, serial in conn.execute(f'''
+                    SELECT p.month, p.file, a.serial_number
+                    FROM Log_Archive a
+                    JOIN Log_Partition p ON p.month = a.month
+                    WHERE {where};
+                    ''', params):
+                        months.setdefault(month, (file, []))[1].append(serial)
+        except OperationalError:
+            return iter(())
+        jobs = ((self._path(file), [(build_query(where), tuple(params))
+                                    for where, params in serial_conditions("l.serial_number", serials)])
+                for _, (file, serials) in sorted(months.items()))
+        return self._iter_attached(jobs, chunk_size)
+
+
+    def _path(self, file: str) -> str:
+        """Path of a catalog file, bare file names of older catalogs are in archive_dir."""
+        return os.path.join(self.archive_dir, file)
+
+
+    def _iter_partitions(self, paths: list, query: str, params: tuple, chunk_size: int):
+        """Runs a query on every archive file, attached read only one at a time."""
+        return self._iter_attached(((path, [(query, params)]) for path in paths), chunk_size)
+
+
+    def _iter_attached(self, jobs, chunk_size: int):
+        """Runs the (query, params) list of every (path, queries) job on its archive file."""
+        conn = None
+        try:
+            for path, queries in jobs:
+                if conn is None:
+                    conn = sqlite3.connect("file::memory:", uri=True)
+                uri = "file:" + os.path.abspath(path).replace("\\", "/") + "?mode=ro"
+                conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_ALIAS};", (uri,))
+                try:
+                    for query, params in queries:
+                        cur = conn.execute(query, params)
+                        while True:
+                            rows = cur.fetchmany(chunk_size)
+                            if not rows:
+                                break
+                            yield rows
+                finally:
+                    conn.execute(f"DETACH DATABASE {ARCHIVE_ALIAS};")
+        except Error as err:
+            print(err)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+    def archive(self, batch_size: int = 5000) -> int:
+        """
+        Moves the logs older than retention_days to their monthly file.
+
+        Rows are copied with their id and deleted from the hot DB batch by batch, each
+        batch in its own short write transaction, so TestStand writers are never held
+        up for long. An interrupted run is resumed by the next one.
+
+        Parameters
+            batch_size (int): Rows moved per transaction.
+
+        Returns
+            moved (int): Number of archived rows.
+        """
+        manager = self.table.manager
+        if manager.in_session:
+            raise RuntimeError("Logs cannot be archived inside a session")
+        os.makedirs(self.archive_dir, exist_ok=True)
+        cutoff = f"-{self.retention_days} days"
+        table_name = self.table.table_name
+        stem = os.path.splitext(os.path.basename(self.table.db_file))[0]
+
+        months = self.table.fetch(f'''
+        SELECT DISTINCT substr(created_on, 1, 7)
+        FROM {table_name}
+        WHERE created_on < datetime('now', ?)
+        ORDER BY 1;
+        ''', (cutoff,)) or []
+
+        moved = 0
+        conn = manager.connection()
+        for month, in months:
+            file = self._month_file(month) \
+                or os.path.abspath(os.path.join(self.archive_dir, f"{stem}_log_{month.replace('-', '_')}.db"))
+            conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_ALIAS};", (file,))
+            try:
+                moved += self._archive_month(conn, month, file, cutoff, batch_size)
+            except Error as err:
+                print(err)
+            finally:
+                conn.execute(f"DETACH DATABASE {ARCHIVE_ALIAS};")
+        return moved
+
+
+    def _month_file(self, month: str) -> str:
+        """Path of the file a month was already archived to, None if it was not."""
+        rows = self.table.fetch("SELECT file FROM Log_Partition WHERE month = ?;", (month,))
+        return self._path(rows[0][0]) if rows else None
+
+
+    def _archive_month(self, conn, month: str, file: str, cutoff: str, batch_size: int) -> int:
+        """Moves the archivable logs of one month to the attached archive."""
+        manager = self.table.manager
+        table_name = self.table.table_name
+        archived = LogTable(f"{ARCHIVE_ALIAS}.{table_name}", self.table.db_file)
+        with manager.transaction():
+            conn.execute(archived.create_table_sql)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_ALIAS}.idx_log_serial_number "
+                         f"ON {table_name}(serial_number);")
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS log_archive_batch(id INTEGER PRIMARY KEY);")
+            conn.execute("INSERT OR IGNORE INTO Log_Partition(month, file) VALUES (?, ?);", (month, file))
+        columns = ", ".join(f'"{row[1]}"' for row in conn.execute(
+            f"PRAGMA {ARCHIVE_ALIAS}.table_info({table_name});"))
+
+        moved = 0
+        while True:
+            with manager.transaction():
+                conn.execute("DELETE FROM temp.log_archive_batch;")
+                count = conn.execute(f'''
+                INSERT INTO temp.log_archive_batch(id)
+                SELECT id FROM main.{table_name}
+                WHERE created_on >= ? AND created_on < datetime(?, '+1 month')
+                  AND created_on < datetime('now', ?)
+                LIMIT ?;
+                ''', (f"{month}-01", f"{month}-01", cutoff, batch_size)).rowcount
+                if count <= 0:
+                    break
+                batch = "SELECT id FROM temp.log_archive_batch"
+                conn.execute(f'''
+                INSERT OR IGNORE INTO {ARCHIVE_ALIAS}.{table_name}({columns})
+                SELECT {columns} FROM main.{table_name} WHERE id IN ({batch});
+                ''')
+                conn.execute(f'''
+                INSERT OR IGNORE INTO Log_Archive(serial_number, month)
+                SELECT DISTINCT serial_number, ? FROM main.{table_name}
+                WHERE id IN ({batch}) AND serial_number IS NOT NULL;
+                ''', (month,))
+                conn.execute(f"DELETE FROM main.{table_name} WHERE id IN ({batch});")
+                conn.execute("UPDATE Log_Partition SET rows = rows + ?, archived_on = CURRENT_TIMESTAMP "
+                             "WHERE month = ?;", (count, month))
+            moved += count
+            if count < batch_size:
+                break
+        return moved
+
+
+    def clear(self) -> None:
+        """
+        Deletes the monthly files and empties the catalog, e.g. when the Log table is dropped.
+
+        The ids of a new Log table start again at 1, rows archived later must not meet
+        the old ones in the same file.
+
+        Returns
+            None
+        """
+        try:
+            with self.table.manager.transaction() as conn:
+                paths = [self._path(file) for file, in conn.execute("SELECT file FROM Log_Partition;")]
+                conn.execute("DELETE FROM Log_Archive;")
+                conn.execute("DELETE FROM Log_Partition;")
+        except OperationalError:
+            # No catalog yet, nothing was archived.
+            return
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+    def compact(self, max_pages: int = 1000, pause: float = 0.2) -> int:
+        """
+        Gives the free pages of the hot DB back to the file system, a few at a time.
+
+        Uses PRAGMA incremental_vacuum, one short write transaction per max_pages, so
+        it can run next to the test station. Needs auto_vacuum = INCREMENTAL, see
+        enable_incremental_vacuum().
+
+        Parameters
+            max_pages   (int): Pages released per transaction.
+            pause       (float): Seconds between two transactions.
+
+        Returns
+            pages (int): Number of released pages.
+        """
+        manager = self.table.manager
+        with manager.reader() as conn:
+            mode = conn.execute("PRAGMA auto_vacuum;").fetchone()[0]
+        if mode != 2:
+            print("auto_vacuum is not INCREMENTAL, run: python archive.py --enable-incremental-vacuum")
+            return 0
+
+        released = 0
+        while not self._stop.is_set():
+            with manager.transaction() as conn:
+                free = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+                if not free:
+                    break
+                conn.execute(f"PRAGMA incremental_vacuum({max_pages});").fetchall()
+            released += min(free, max_pages)
+            self._stop.wait(pause)
+        with manager.reader() as conn:
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE);").fetchall()
+        return released
+
+
+    def start(self, interval: float = 3600) -> None:
+        """
+        Archives and compacts in a background thread.
+
+        Parameters
+            interval (float): Seconds between two runs.
+
+        Returns
+            None
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="issa-log-archive", daemon=True)
+        self._thread.start()
+
+
+    def stop(self) -> None:
+        """Stops the background thread after its current batch."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.is_set():
+            try:
+                self.archive()
+                self.compact()
+            except Error as err:
+                print(err)
+            self._stop.wait(interval)
+
+
+def enable_incremental_vacuum(db_file: str = DB_FILE) -> None:
+    """
+    Switches the hot DB to auto_vacuum = INCREMENTAL.
+
+    Rewrites the whole file with VACUUM, once, while the station is idle.
+
+    Parameters
+        db_file (str): Path to the SQLite DB.
+
+    Returns
+        None
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+        conn.execute("VACUUM;")
+    finally:
+        conn.close()
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="Archive old logs and compact the ISSA DB.")
+    parser.add_argument("--db", default=DB_FILE, help="Path to the SQLite DB.")
+    parser.add_argument("--days", type=int, default=None, help="Archive logs older than this.")
+    parser.add_argument("--dir", default=None, help="Archive folder.")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Switch the DB to auto_vacuum = INCREMENTAL (full VACUUM, run once).")
+    args = parser.parse_args()
+
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum(args.db)
+    log_archive = LogArchive(LogTable(db_file=args.db), args.dir, args.days)
+    print(f"Archived {log_archive.archive()} log rows")
+    print(f"Released {log_archive.compact()} pages")
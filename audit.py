@@ -0,0 +1,162 @@
+"""Asynchronous audit trail of the statements executed by ISSA."""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from batching import drain
+
+
+class AuditLog:
+    """
+    A class to represent a buffered, append-only audit trail.
+
+    Callers only put records into a bounded queue, a background thread formats them
+    and appends them in batches to a rotating file. If the queue is full the record
+    is dropped and counted instead of blocking the caller.
+
+    Attributes:
+        path            (str): Audit file path.
+        max_bytes       (int): Size at which the file is rotated.
+        backup_count    (int): Number of rotated files kept (path.1, path.2, ...).
+        batch_size      (int): Max number of records written at once.
+        flush_interval  (float): Max seconds a record waits before being written.
+        dropped         (int): Records discarded because the queue was full.
+
+    Methods:
+        record(query, params):
+            Queues a statement and its parameters.
+        flush():
+            Blocks until every queued record is written.
+        close():
+            Writes the pending records and stops the writer thread.
+    """
+    def __init__(self,
+                 path: str = "C:/Pruef/issa.txt",
+                 max_bytes: int = 5 * 1024 * 1024,
+                 backup_count: int = 5,
+                 queue_size: int = 10000,
+                 batch_size: int = 500,
+                 flush_interval: float = 1.0) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="issa-audit", daemon=True)
+        self._thread.start()
+
+
+    def record(self, query: str, params: list) -> None:
+        """
+        Queues a statement and its parameters.
+
+        Parameters
+            query   (str): SQL statement.
+            params  (list): Parameter rows used with the statement.
+
+        Returns
+            None
+        """
+        if self._closed:
+            return
+        try:
+            self._queue.put_nowait((time.time(), query, params))
+        except queue.Full:
+            self.dropped += 1
+
+
+    def flush(self) -> None:
+        """Blocks until every queued record is written."""
+        self._queue.join()
+
+
+    def close(self) -> None:
+        """Writes the pending records and stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+
+    def _run(self) -> None:
+        """Writer thread, drains the queue in batches."""
+        drain(self._queue, self.batch_size, self.flush_interval, self._write, self._failed)
+
+
+    def _failed(self, records: list, err: Exception) -> None:
+        """The batch is lost, the trail goes on with the next one."""
+        print(err)
+
+
+    def _write(self, records: list) -> None:
+        """Appends a batch of records, rotating the file if needed."""
+        lines = []
+        for created, query, params in records:
+            stamp = datetime.fromtimestamp(created).isoformat(sep=" ", timespec="milliseconds")
+            lines.append(f"{stamp} {query}\n")
+            lines.extend(f"    {row}\n" for row in params)
+        text = "".join(lines)
+
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size and size + len(text) > self.max_bytes:
+            self._rotate()
+        with open(self.path, 'a', encoding="utf-8") as log:
+            log.write(text)
+
+
+    def _rotate(self) -> None:
+        """Shifts path -> path.1 -> path.2 ... dropping the oldest file."""
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{index}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+_audit_log = None
+_audit_lock = threading.Lock()
+
+
+def configure(enabled: bool, **kwargs) -> AuditLog:
+    """
+    Turns the audit trail on or off.
+
+    Parameters
+        enabled (bool): Start (True) or stop (False) the audit trail.
+        kwargs  (dict): AuditLog options (path, max_bytes, backup_count, ...).
+
+    Returns
+        audit_log (AuditLog): Running audit trail, None if disabled.
+    """
+    global _audit_log
+    with _audit_lock:
+        if _audit_log is not None:
+            _audit_log.close()
+            _audit_log = None
+        if enabled:
+            _audit_log = AuditLog(**kwargs)
+        return _audit_log
+
+
+def get_audit_log() -> AuditLog:
+    """Gets the running audit trail, None if disabled."""
+    return _audit_log
+
+
+@atexit.register
+def _shutdown() -> None:
+    configure(False)
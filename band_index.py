@@ -0,0 +1,145 @@
+"""In-memory index of the RF band plan."""
+
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+import cache
+from issa import DB_FILE, FREQUENCY_TOLERANCE, BandTable
+from rf_bands import LTE, WCMDA, GSM
+
+
+Band = namedtuple("Band", ["tech", "band", "frequency", "direction", "target"])
+
+
+class BandIndex:
+    """
+    A class to represent an immutable index of the band plan.
+
+    Frequencies are bucketed by tolerance, so a (tech, band, frequency) lookup only
+    checks three buckets whatever the size of the plan.
+
+    Attributes:
+        tolerance (float): Max frequency difference in MHz.
+
+    Methods:
+        from_rf_bands():
+            Builds the index from rf_bands.LTE, WCMDA and GSM.
+        from_table(db_file):
+            Builds the index from the Band table.
+        lookup(tech, band, frequency):
+            Gets the band plan entry of a measurement.
+        is_valid(tech, band, frequency):
+            True if the band plan has the frequency.
+    """
+    __slots__ = ("tolerance", "_buckets", "_size")
+
+    def __init__(self, bands, tolerance: float = FREQUENCY_TOLERANCE) -> None:
+        buckets = {}
+        size = 0
+        for entry in bands:
+            if isinstance(entry, dict):
+                entry = Band(entry["tech"], entry["band"], entry["frequency"], entry["direction"], entry["target"])
+            entry = Band(entry[0].lower(), int(entry[1]), float(entry[2]), entry[3], float(entry[4]))
+            key = (entry.tech, entry.band, round(entry.frequency / tolerance))
+            buckets[key] = buckets.get(key, ()) + (entry,)
+            size += 1
+        object.__setattr__(self, "tolerance", tolerance)
+        object.__setattr__(self, "_buckets", MappingProxyType(buckets))
+        object.__setattr__(self, "_size", size)
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError("BandIndex is immutable")
+
+
+    def __len__(self) -> int:
+        return self._size
+
+
+    @classmethod
+    def from_rf_bands(cls, tolerance: float = FREQUENCY_TOLERANCE) -> "BandIndex":
+        """Builds the index from rf_bands.LTE, WCMDA and GSM."""
+        return cls(LTE + WCMDA + GSM, tolerance)
+
+
+    @classmethod
+    def from_table(cls, db_file: str = DB_FILE, tolerance: float = FREQUENCY_TOLERANCE) -> "BandIndex":
+        """
+        Builds the index from the Band table, or from rf_bands if the table is empty.
+
+        Parameters
+            db_file     (str): Path to the SQLite DB.
+            tolerance   (float): Max frequency difference in MHz.
+
+        Returns
+            index (BandIndex): Band plan index.
+        """
+        rows = BandTable(db_file=db_file).get_bands()
+        if not rows:
+            return cls.from_rf_bands(tolerance)
+        return cls(rows, tolerance)
+
+
+    def lookup(self, tech: str, band: int, frequency: float) -> Band:
+        """
+        Gets the band plan entry of a measurement.
+
+        Parameters
+            tech        (str): Technology, e.g. lte.
+            band        (int): Band number.
+            frequency   (float): Frequency in MHz.
+
+        Returns
+            band (Band): Closest entry within tolerance, None if there is none.
+        """
+        tech, band = tech.lower(), int(band)
+        bucket = round(frequency / self.tolerance)
+        best = None
+        for key in (bucket - 1, bucket, bucket + 1):
+            for entry in self._buckets.get((tech, band, key), ()):
+                distance = abs(entry.frequency - frequency)
+                if distance <= self.tolerance and (best is None or distance < abs(best.frequency - frequency)):
+                    best = entry
+        return best
+
+
+    def is_valid(self, tech: str, band: int, frequency: float) -> bool:
+        """True if the band plan has the frequency."""
+        return self.lookup(tech, band, frequency) is not None
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_band_index(db_file: str = DB_FILE) -> BandIndex:
+    """
+    Gets the band plan index of a DB, loading it once.
+
+    The index is rebuilt on next use after rows are inserted into the Band table or
+    the table is dropped by this process. Use refresh() after another process changed
+    the band plan.
+
+    Parameters
+        db_file (str): Path to the SQLite DB.
+
+    Returns
+        index (BandIndex): Band plan index.
+    """
+    index = _indexes.get(db_file)
+    if index is not None:
+        return index
+    with _indexes_lock:
+        index = _indexes.get(db_file)
+        if index is None:
+            if not cache.has_listeners(db_file, "Band"):
+                cache.on_change(db_file, "Band", lambda: _indexes.pop(db_file, None))
+            index = _indexes[db_file] = BandIndex.from_table(db_file)
+        return index
+
+
+def refresh(db_file: str = DB_FILE) -> BandIndex:
+    """Reloads the band plan index of a DB."""
+    _indexes.pop(db_file, None)
+    return get_band_index(db_file)
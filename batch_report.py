@@ -0,0 +1,171 @@
+"""Parallel batch report generation for many serial numbers."""
+
+import argparse
+import multiprocessing
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from excel import write_sheets
+from issa import ProductTable, ProductBenchmarkTable, LogTable
+from report import Report, BENCHMARK_COLUMNS, LOG_COLUMNS, DIDS_COLUMNS
+
+
+REPORTS = {
+    "Benchmark": "write_product_benchmark",
+    "LogTest": "write_log_test",
+    "DIDs_Report": "write_dids_report",
+}
+
+BatchResult = namedtuple("BatchResult", ["serial_number", "path", "seconds", "error"])
+
+
+def _write_report(report_name: str, serial_number: str, streaming: bool) -> BatchResult:
+    """Writes one per-serial report file, runs in a worker process."""
+    start = time.perf_counter()
+    path = None
+    try:
+        report = Report(streaming=streaming)
+        path = report.dated_path(serial_number, report_name)
+        getattr(report, REPORTS[report_name])(serial_number, path=path)
+        error = None
+    except Exception as err:  # pylint: disable=broad-except
+        error = repr(err)
+    return BatchResult(serial_number, path, time.perf_counter() - start, error)
+
+
+class BatchReport:
+    """
+    A class to represent a batch of reports over many serial numbers.
+
+    Per-serial files (SerialNumber_ReportName_YYMMDD.xlsx) are written in parallel by a
+    process pool. A single multi-sheet workbook is written by one process, with the
+    benchmark and DID rows of all the serials read by one set-based query.
+
+    Attributes:
+        report_name (str): Benchmark, LogTest or DIDs_Report.
+        workers     (int): Worker processes, CPU count if None.
+        streaming   (bool): Use the constant memory writer.
+        progress    (callable): Called as progress(done, total, result) after every report.
+
+    Methods:
+        run(serial_numbers, serial_range, product_type):
+            Writes one report file per serial number.
+        run_workbook(serial_numbers, serial_range, product_type):
+            Writes one workbook with one sheet per serial number.
+    """
+    def __init__(self,
+                 report_name: str = "Benchmark",
+                 workers: int = None,
+                 streaming: bool = True,
+                 progress=None) -> None:
+        if report_name not in REPORTS:
+            raise ValueError(f"Unknown report: {report_name}")
+        self.report_name = report_name
+        self.workers = workers
+        self.streaming = streaming
+        self.progress = progress
+
+
+    def run(self, serial_numbers: list = None, serial_range: tuple = None, product_type: str = None) -> list:
+        """
+        Writes one report file per serial number.
+
+        Parameters
+            serial_numbers  (list): Serial numbers.
+            serial_range    (tuple): (first, last) serial numbers, both included.
+            product_type    (str): Product type.
+
+        Returns
+            results (list): BatchResult of every serial number, in completion order.
+        """
+        serials = ProductTable().get_serial_numbers(serial_numbers, serial_range, product_type)
+        results = []
+        # spawn, like on Windows: workers open their own SQLite connections.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            futures = [pool.submit(_write_report, self.report_name, serial, self.streaming)
+                       for serial in serials]
+            for future in as_completed(futures):
+                results.append(future.result())
+                if self.progress:
+                    self.progress(len(results), len(serials), results[-1])
+        return results
+
+
+    def run_workbook(self,
+                     serial_numbers: list = None,
+                     serial_range: tuple = None,
+                     product_type: str = None,
+                     path: str = None) -> list:
+        """
+        Writes one workbook with one sheet per serial number.
+
+        Serial numbers without benchmarks or DIDs get no sheet, their result has error
+        "no rows". Logs are streamed, a serial number without logs gets an empty sheet.
+
+        Parameters
+            serial_numbers  (list): Serial numbers.
+            serial_range    (tuple): (first, last) serial numbers, both included.
+            product_type    (str): Product type.
+            path            (str): Workbook path, reports/<ReportName>_Batch_YYMMDD.xlsx if None.
+
+        Returns
+            results (list): BatchResult of every serial number.
+        """
+        report = Report()
+        path = path or report.dated_path(self.report_name, "Batch")
+        serials = ProductTable().get_serial_numbers(serial_numbers, serial_range, product_type)
+        results = []
+
+        def sheets():
+            if self.report_name == "Benchmark":
+                groups = ProductBenchmarkTable().iter_product_benchmarks(serials)
+                columns = BENCHMARK_COLUMNS
+            elif self.report_name == "LogTest":
+                log = LogTable()
+                groups = ((serial, log.iter_logs_by_serial_number(serial)) for serial in serials)
+                columns = LOG_COLUMNS
+            else:
+                groups = ProductTable().iter_product_dids(serials)
+                columns = DIDS_COLUMNS
+            for serial, rows in groups:
+                start = time.perf_counter()
+                chunks = rows if self.report_name == "LogTest" else [rows]
+                yield serial, columns, chunks
+                results.append(BatchResult(serial, path, time.perf_counter() - start, None))
+                if self.progress:
+                    self.progress(len(results), len(serials), results[-1])
+
+        write_sheets(path, sheets())
+        written = {result.serial_number for result in results}
+        for serial in serials:
+            if serial not in written:
+                results.append(BatchResult(serial, None, 0.0, "no rows"))
+                if self.progress:
+                    self.progress(len(results), len(serials), results[-1])
+        return results
+
+
+def _print_progress(done: int, total: int, result: BatchResult) -> None:
+    status = result.error or result.path
+    print(f"[{done}/{total}] {result.serial_number} {result.seconds:.2f}s {status}")
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="Write reports for many serial numbers.")
+    parser.add_argument("--report", default="Benchmark", choices=sorted(REPORTS))
+    parser.add_argument("--serials", nargs="+", help="Serial numbers.")
+    parser.add_argument("--range", nargs=2, metavar=("FIRST", "LAST"), help="Serial number range.")
+    parser.add_argument("--type", help="Product type.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes.")
+    parser.add_argument("--workbook", action="store_true", help="One multi-sheet workbook.")
+    args = parser.parse_args()
+
+    batch = BatchReport(args.report, workers=args.workers, progress=_print_progress)
+    start = time.perf_counter()
+    if args.workbook:
+        batch.run_workbook(args.serials, args.range, args.type)
+    else:
+        batch.run(args.serials, args.range, args.type)
+    print(f"Done in {time.perf_counter() - start:.2f}s")
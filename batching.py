@@ -0,0 +1,45 @@
+"""Batch consumer of the queues of the background writers (audit.py, log_writer.py)."""
+
+import queue
+import time
+
+
+def drain(items: queue.Queue, batch_size: int, max_wait: float, write, on_error) -> None:
+    """
+    Consumes a queue in batches until a None sentinel is received.
+
+    A batch is handed over when batch_size items are waiting or when the first one
+    waited max_wait seconds. task_done() is called for every item, so join() on the
+    queue returns once the items are written or failed, and the loop survives any
+    error of write.
+
+    Parameters
+        items       (Queue): Queue of the records, None stops the loop.
+        batch_size  (int): Max number of records handed over at once.
+        max_wait    (float): Max seconds a record waits for its batch.
+        write       (callable): Called as write(records).
+        on_error    (callable): Called as on_error(records, err) if write raised.
+
+    Returns
+        None
+    """
+    running = True
+    while running:
+        batch = [items.get()]
+        deadline = time.monotonic() + max_wait
+        while len(batch) < batch_size and batch[-1] is not None:
+            try:
+                batch.append(items.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        if batch[-1] is None:
+            running = False
+        records = [item for item in batch if item is not None]
+        try:
+            if records:
+                write(records)
+        except Exception as err:  # pylint: disable=broad-except
+            on_error(records, err)
+        finally:
+            for _ in batch:
+                items.task_done()
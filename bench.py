@@ -0,0 +1,275 @@
+"""Reproducible benchmarks of the ingest, query and report hot paths.
+
+A DB is generated at the requested scale from a seeded random generator, then every
+timed path runs `--repeat` times on a seeded sample of serial numbers. Results are
+written as JSON, and compared with a previous run with --compare.
+
+    python bench.py --units 2000 --steps 30 --logs 100 --output bench_2000.json
+    python bench.py --units 2000 --compare bench_2000.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from issa import (ISSA, ProductTable, LogTable, BenchmarkTable, ProductBenchmarkTable,
+                  TestTable, ProductTestTable, session)
+from migrations import migrate
+from rf_bands import LTE, WCMDA, GSM
+
+PRODUCT_TYPES = ["2021-100-002-00", "2021-100-003-00", "2022-200-001-00"]
+START = datetime(2026, 1, 1)
+
+
+class Bench:
+    """
+    A class to represent a benchmark run.
+
+    Attributes:
+        db_file (str): Path of the generated SQLite DB.
+        units   (int): Products of the DB.
+        steps   (int): Benchmark steps per product.
+        logs    (int): Log lines per product.
+        tests   (int): Test results per product, one in ten is a DID.
+        seed    (int): Seed of the data and of the samples.
+        repeat  (int): Runs of every timed path.
+        results (dict): Path name -> timing statistics.
+
+    Methods:
+        from_db(db_file, repeat, seed):
+            Benchmark of an existing DB, e.g. a production copy.
+        generate():
+            Creates the DB at the requested scale.
+        run():
+            Times every hot path.
+    """
+    def __init__(self, db_file: str, units: int = 1000, steps: int = 30, logs: int = 50,
+                 tests: int = 40, seed: int = 42, repeat: int = 20) -> None:
+        self.db_file = db_file
+        self.units = units
+        self.steps = steps
+        self.logs = logs
+        self.tests = tests
+        self.seed = seed
+        self.repeat = repeat
+        self.results = {}
+        self.serial_numbers = [f"B{30000000000 + i}" for i in range(units)]
+        self.step_names = [f"step {i + 1}" for i in range(steps)]
+        self.test_definitions = [
+            (f"did {i + 1}" if i % 10 == 0 else f"test {i + 1}", "numeric", "0", "10", "V")
+            for i in range(tests)]
+
+
+    @classmethod
+    def from_db(cls, db_file: str, repeat: int = 20, seed: int = 42) -> "Bench":
+        """
+        Creates the benchmark of an existing DB, sampling its own units, steps and tests.
+
+        run() inserts new units: use a copy of a production DB.
+
+        Parameters
+            db_file (str): Path of the SQLite DB.
+            repeat  (int): Runs of every timed path.
+            seed    (int): Seed of the samples.
+
+        Returns
+            bench (Bench): Benchmark, not to be generated.
+        """
+        bench = cls(db_file, units=0, steps=0, tests=0, seed=seed, repeat=repeat)
+        issa = ISSA(db_file)
+        bench.serial_numbers = [row[0] for row in issa.fetch("SELECT serial_number FROM Product;") or []]
+        bench.units = len(bench.serial_numbers)
+        bench.step_names = [row[0] for row in issa.fetch("SELECT name FROM Benchmark ORDER BY id;") or []]
+        bench.steps = len(bench.step_names)
+        bench.test_definitions = [tuple(row) for row in issa.fetch(
+            "SELECT name, type, min_limit, max_limit, units FROM Test ORDER BY id;") or []]
+        bench.tests = len(bench.test_definitions)
+        return bench
+
+
+    def generate(self) -> None:
+        """Creates the DB at the requested scale, with the bulk insert paths."""
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_file + suffix):
+                os.remove(self.db_file + suffix)
+        migrate(self.db_file)
+        rng = random.Random(self.seed)
+        issa = ISSA(self.db_file)
+
+        start = time.perf_counter()
+        with session(self.db_file):
+            issa.insert_many("Band", LTE + WCMDA + GSM)
+            BenchmarkTable(db_file=self.db_file).resolve_ids(self.step_names)
+            TestTable(db_file=self.db_file).resolve_ids(self.test_definitions)
+        step_ids = BenchmarkTable(db_file=self.db_file).resolve_ids(self.step_names)
+        test_ids = TestTable(db_file=self.db_file).resolve_ids(self.test_definitions)
+        bands = LTE + WCMDA + GSM
+
+        for first in range(0, self.units, 100):
+            products, logs, benchmarks, results, measurements = [], [], [], [], []
+            for index in range(first, min(first + 100, self.units)):
+                serial = self.serial_numbers[index]
+                created = (START + timedelta(minutes=10 * index)).strftime("%Y-%m-%d %H:%M:%S")
+                products.append((serial, "Model S", PRODUCT_TYPES[index % len(PRODUCT_TYPES)], created))
+                logs.extend(("verbose", f"{serial} log line {line} value {rng.randint(0, 999)}", serial, created)
+                            for line in range(self.logs))
+                benchmarks.extend((serial, step_ids[name], rng.randint(1, 20), created) for name in self.step_names)
+                results.extend((serial, test_ids[test[0]], str(rng.randint(0, 10)), created)
+                               for test in self.test_definitions)
+                band = bands[rng.randrange(len(bands))]
+                measurements.append((serial, band["frequency"], band["target"] + rng.uniform(-3, 3), "dBm", created))
+            with session(self.db_file):
+                issa.insert_many("Product", products, ["serial_number", "desc", "type", "created_on"])
+                issa.insert_many("Log", logs, ["type", "desc", "serial_number", "created_on"])
+                issa.insert_many("Product_Benchmark", benchmarks,
+                                 ["serial_number", "benchmark_id", "duration_sec", "created_on"])
+                issa.insert_many("Product_Test", results, ["serial_number", "test_id", "result", "created_on"])
+                issa.insert_many("Product_Band", measurements,
+                                 ["serial_number", "frequency", "power", "units", "created_on"])
+        self.results["generate"] = {"seconds": time.perf_counter() - start,
+                                    "db_bytes": os.path.getsize(self.db_file)}
+
+
+    def measure(self, name: str, func, args_list: list) -> None:
+        """
+        Times func once per arguments tuple and keeps the statistics.
+
+        Parameters
+            name        (str): Result name.
+            func        (callable): Timed function.
+            args_list   (list): Argument tuples, one per run.
+
+        Returns
+            None
+        """
+        durations, rows = [], 0
+        for args in args_list:
+            start = time.perf_counter()
+            result = func(*args)
+            durations.append(time.perf_counter() - start)
+            if isinstance(result, list):
+                rows += len(result)
+        durations.sort()
+        self.results[name] = {
+            "runs": len(durations),
+            "min_ms": durations[0] * 1000,
+            "median_ms": statistics.median(durations) * 1000,
+            "mean_ms": statistics.mean(durations) * 1000,
+            "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000,
+            "max_ms": durations[-1] * 1000,
+            "rows": rows,
+        }
+        print(f"{name:48s} {self.results[name]['median_ms']:10.3f} ms median")
+
+
+    def run(self) -> dict:
+        """
+        Times every hot path.
+
+        Returns
+            results (dict): Path name -> timing statistics.
+        """
+        from report import Report
+
+        rng = random.Random(self.seed + 1)
+        sample = [(serial,) for serial in rng.sample(self.serial_numbers, min(self.repeat, self.units))]
+        new = [f"N{40000000000 + i}" for i in range(self.repeat)]
+        db = self.db_file
+
+        issa = ISSA(db)
+        self.measure("ISSA.insert", issa.insert, [(
+            {"table_name": "Log", "table_values": [
+                {"type": "verbose", "desc": f"line {line}", "serial_number": serial} for line in range(self.logs)]},
+        ) for serial in new])
+        self.measure("ProductTestTable.insert_product_test", ProductTestTable(db_file=db).insert_product_test,
+                     [(serial, [test + (str(rng.randint(0, 10)),) for test in self.test_definitions])
+                      for serial in new])
+        benchmark = ProductBenchmarkTable(db_file=db)
+        self.measure("ProductBenchmarkTable.insert_product_benchmark", benchmark.insert_product_benchmark,
+                     [(serial, self.step_names[0], rng.randint(1, 20)) for serial in new])
+        self.measure("ProductBenchmarkTable.insert_product_benchmarks", benchmark.insert_product_benchmarks,
+                     [(serial, [(name, rng.randint(1, 20)) for name in self.step_names]) for serial in new])
+
+        self.measure("ProductBenchmarkTable.get_product_benchmark", benchmark.get_product_benchmark, sample)
+        self.measure("LogTable.get_logs_by_serial_number", LogTable(db_file=db).get_logs_by_serial_number, sample)
+        self.measure("ProductTable.get_product_dids", ProductTable(db_file=db).get_product_dids, sample)
+
+        with tempfile.TemporaryDirectory() as folder:
+            cwd = os.getcwd()
+            os.chdir(folder)
+            try:
+                self._time_reports(Report, sample[:max(1, self.repeat // 4)])
+            finally:
+                os.chdir(cwd)
+        return self.results
+
+
+    def _time_reports(self, report_class, sample: list) -> None:
+        """Times every Report.write_* in pandas and streaming mode."""
+        for streaming in (False, True):
+            mode = "streaming" if streaming else "pandas"
+            report = report_class(streaming=streaming, db_file=self.db_file)
+            for method in ("write_product_benchmark", "write_log_test", "write_dids_report"):
+                self.measure(f"Report.{method}[{mode}]", getattr(report, method),
+                             [(serial, f"{method}.xlsx") for serial, in sample])
+            # Report on the last row of Product, the highest serial number.
+            for method in ("write_last_product_benchmark", "write_log_test_last_product"):
+                self.measure(f"Report.{method}[{mode}]", getattr(report, method), [()] * len(sample))
+        report = report_class(db_file=self.db_file)
+        self.measure("Report.write_product_type_benchmark", report.write_product_type_benchmark,
+                     [(PRODUCT_TYPES[0], "stats.xlsx")])
+        day = (START.strftime("%Y-%m-%d %H:%M:%S"), (START + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S"))
+        self.measure("Report.write_time_window", report.write_time_window, [day + ("window.xlsx",)])
+
+
+def compare(results: dict, baseline: dict) -> None:
+    """Prints the median change of every path against a previous run."""
+    for name, result in results.items():
+        before = baseline.get(name, {}).get("median_ms")
+        if before and "median_ms" in result:
+            change = result["median_ms"] / before - 1
+            print(f"{name:48s} {before:10.3f} -> {result['median_ms']:10.3f} ms ({change:+.1%})")
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="Benchmark the ISSA ingest, query and report paths.")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "issa_bench.db"),
+                        help="Generated DB path, overwritten.")
+    parser.add_argument("--units", type=int, default=1000, help="Products.")
+    parser.add_argument("--steps", type=int, default=30, help="Benchmark steps per product.")
+    parser.add_argument("--logs", type=int, default=50, help="Log lines per product.")
+    parser.add_argument("--tests", type=int, default=40, help="Test results per product.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed.")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs of every timed path.")
+    parser.add_argument("--output", default="bench_results.json", help="JSON results path.")
+    parser.add_argument("--compare", help="JSON results of a previous run.")
+    args = parser.parse_args()
+
+    bench = Bench(args.db, args.units, args.steps, args.logs, args.tests, args.seed, args.repeat)
+    bench.generate()
+    print(f"Generated {args.units} units in {bench.results['generate']['seconds']:.2f}s")
+    results = bench.run()
+
+    output = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "parameters": {key: getattr(args, key) for key in ("units", "steps", "logs", "tests", "seed", "repeat")},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(output, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            compare(results, json.load(file)["results"])
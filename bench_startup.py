@@ -0,0 +1,93 @@
+"""Cold start benchmark of the iSSA UI.
+
+Every run starts a fresh interpreter, imports ui and, when a display is available,
+draws the window once. The median times are compared with the thresholds and the
+modules the UI must not load at startup are checked.
+
+    python bench_startup.py --runs 5 --max-import-ms 300 --max-window-ms 1000
+
+Exits with 1 if a threshold is exceeded or a heavy module is imported.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl")
+
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import ui
+imported = time.perf_counter() - start
+window = None
+if {window}:
+    import tkinter
+    def _draw(self, n=0):
+        self.update()
+        self.window_seconds = time.perf_counter() - start
+        self.destroy()
+    tkinter.Tk.mainloop = _draw
+    try:
+        window = ui.ISSAInterface().window.window_seconds
+    except tkinter.TclError:
+        pass
+print(json.dumps({{
+    "import": imported,
+    "window": window,
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def run_once(window: bool) -> dict:
+    """
+    Starts the UI in a fresh interpreter.
+
+    Parameters
+        window (bool): Also draw the window.
+
+    Returns
+        timings (dict): import and window seconds, heavy modules loaded.
+    """
+    code = _CHILD.format(window=window, heavy=HEAVY_MODULES)
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=here, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cold start benchmark of the iSSA UI.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters started.")
+    parser.add_argument("--max-import-ms", type=float, default=300, help="Median import time threshold.")
+    parser.add_argument("--max-window-ms", type=float, default=1000, help="Median first draw threshold.")
+    parser.add_argument("--no-window", action="store_true", help="Only time the imports.")
+    args = parser.parse_args()
+
+    runs = [run_once(not args.no_window) for _ in range(args.runs)]
+    import_ms = statistics.median(run["import"] for run in runs) * 1000
+    windows = [run["window"] for run in runs if run["window"] is not None]
+    heavy = sorted({name for run in runs for name in run["heavy"]})
+
+    failed = False
+    print(f"import ui: {import_ms:.1f} ms (max {args.max_import_ms:.0f} ms)")
+    failed |= import_ms > args.max_import_ms
+    if windows:
+        window_ms = statistics.median(windows) * 1000
+        print(f"first draw: {window_ms:.1f} ms (max {args.max_window_ms:.0f} ms)")
+        failed |= window_ms > args.max_window_ms
+    elif not args.no_window:
+        print("first draw: skipped, no display")
+    if heavy:
+        print(f"loaded at startup: {', '.join(heavy)}")
+        failed = True
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if "__main__" == __name__:
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Process-wide caches of the ISSA lookup tables."""
+
+import threading
+
+
+class NameIdCache:
+    """
+    A class to represent a name -> id cache of a lookup table (Test, Benchmark, ...).
+
+    Only committed rows must be put into the cache, use
+    ConnectionManager.after_commit to update it from inside a transaction. Another
+    process may drop and create the table again, readers call validate() with the
+    PRAGMA schema_version of their connection before trusting the cached ids.
+
+    Attributes:
+        warm            (bool): True once the whole table has been loaded.
+        schema_version  (int): PRAGMA schema_version the ids were read under.
+
+    Methods:
+        get_many(names):
+            Gets the cached ids of the requested names.
+        update(ids):
+            Adds name -> id pairs to the cache.
+        validate(schema_version):
+            Forgets every cached id if the DB schema changed.
+        invalidate():
+            Forgets every cached id.
+    """
+    def __init__(self) -> None:
+        self.warm = False
+        self.schema_version = None
+        self._ids = {}
+        self._lock = threading.Lock()
+
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+    def get(self, name: str) -> int:
+        """Gets the cached id of name, None if unknown."""
+        return self._ids.get(name)
+
+
+    def get_many(self, names: list) -> dict:
+        """
+        Gets the cached ids of the requested names.
+
+        Parameters
+            names (list): Names to look for.
+
+        Returns
+            ids (dict): name -> id of the cached names only.
+        """
+        ids = self._ids
+        return {name: ids[name] for name in names if name in ids}
+
+
+    def update(self, ids: dict, warm: bool = False) -> None:
+        """
+        Adds name -> id pairs to the cache.
+
+        Parameters
+            ids     (dict): name -> id pairs.
+            warm    (bool): True if ids holds the whole table.
+
+        Returns
+            None
+        """
+        with self._lock:
+            self._ids = {**self._ids, **ids}
+            self.warm = self.warm or warm
+
+
+    def validate(self, schema_version: int) -> None:
+        """
+        Forgets every cached id if the DB schema changed since they were read.
+
+        Parameters
+            schema_version (int): Current PRAGMA schema_version of the DB.
+
+        Returns
+            None
+        """
+        with self._lock:
+            if self.schema_version != schema_version:
+                self._ids = {}
+                self.warm = False
+                self.schema_version = schema_version
+
+
+    def invalidate(self) -> None:
+        """Forgets every cached id."""
+        with self._lock:
+            self._ids = {}
+            self.warm = False
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+_listeners = {}
+
+
+def get_cache(db_file: str, table_name: str) -> NameIdCache:
+    """
+    Gets the cache of a lookup table.
+
+    Parameters
+        db_file     (str): Path to the SQLite DB.
+        table_name  (str): DB table name.
+
+    Returns
+        cache (NameIdCache): Shared cache.
+    """
+    key = (db_file, table_name)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = NameIdCache()
+        return cache
+
+
+def on_change(db_file: str, table_name: str, callback) -> None:
+    """
+    Registers a callback run after rows of a table are inserted, or the table dropped.
+
+    Parameters
+        db_file     (str): Path to the SQLite DB.
+        table_name  (str): DB table name.
+        callback    (callable): Function without arguments.
+
+    Returns
+        None
+    """
+    with _caches_lock:
+        _listeners.setdefault((db_file, table_name), []).append(callback)
+
+
+def has_listeners(db_file: str, table_name: str) -> bool:
+    """True if a callback is registered for the table."""
+    return (db_file, table_name) in _listeners
+
+
+def notify_change(db_file: str, table_name: str) -> None:
+    """
+    Runs the callbacks registered for a table.
+
+    Parameters
+        db_file     (str): Path to the SQLite DB.
+        table_name  (str): DB table name.
+
+    Returns
+        None
+    """
+    for callback in list(_listeners.get((db_file, table_name), [])):
+        callback()
+
+
+def invalidate(db_file: str, table_name: str = None) -> None:
+    """
+    Invalidates the cache of a table, or of every table of the DB if table_name is None.
+
+    Parameters
+        db_file     (str): Path to the SQLite DB.
+        table_name  (str): DB table name.
+
+    Returns
+        None
+    """
+    with _caches_lock:
+        caches = [cache for (db, table), cache in _caches.items()
+                  if db == db_file and table_name in (None, table)]
+        tables = [table for db, table in _listeners if db == db_file and table_name in (None, table)]
+    for cache in caches:
+        cache.invalidate()
+    for table in tables:
+        notify_change(db_file, table)
@@ -0,0 +1,175 @@
+"""ISSA configuration: DB path, SQLite performance profile and audit trail."""
+
+import configparser
+import os
+
+
+PROFILES = {
+    # SQLite defaults: rollback journal, full sync, no busy timeout.
+    "legacy": {},
+    # TestStand writers and the report UI working on the same DB.
+    "station": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    # Big report queries, more cache and mmap.
+    "reporting": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+    },
+}
+
+PRAGMAS = ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store", "busy_timeout")
+
+
+class Settings:
+    """
+    A class to represent the ISSA settings.
+
+    Values are read from an INI file (ISSA_CONFIG env var, or issa.ini in the working
+    directory) and can be overridden with ISSA_DB, ISSA_PROFILE, ISSA_AUDIT and
+    ISSA_AUDIT_FILE env vars.
+
+        [issa]
+        db_file = C:/Pruef/Sqlite/db/pme.db
+        profile = station
+        busy_retries = 5
+        busy_backoff = 0.05
+
+        [profile:station]
+        cache_size = -32000
+
+        [audit]
+        enabled = false
+        path = C:/Pruef/issa.txt
+
+        [archive]
+        dir = C:/Pruef/Sqlite/db/archive
+        retention_days = 180
+
+        [instrumentation]
+        enabled = false
+        interval = 60
+
+    A [profile:<name>] section creates a profile or overrides the pragmas of a
+    built in one.
+
+    Attributes:
+        db_file         (str): Path to the SQLite DB.
+        profile_name    (str): Name of the performance profile.
+        profile         (dict): PRAGMA name -> value applied on every connection.
+        busy_retries    (int): Retries of a write transaction on a locked DB.
+        busy_backoff    (float): First retry delay in seconds, doubled every retry.
+        audit_enabled   (bool): Start the audit trail.
+        audit_path      (str): Audit trail file path.
+        archive_dir     (str): Folder of the monthly Log archives, None for <DB folder>/archive.
+        retention_days  (int): Age in days after which logs are archived.
+        instrumentation_enabled     (bool): Record method latencies and SQL statements
+                                            (ISSA_INSTRUMENT env var).
+        instrumentation_interval    (float): Seconds between two summary lines, 0 for none.
+    """
+    def __init__(self, path: str = None) -> None:
+        parser = configparser.ConfigParser()
+        path = path or os.environ.get("ISSA_CONFIG", "issa.ini")
+        parser.read(path, encoding="utf-8")
+
+        issa = parser["issa"] if parser.has_section("issa") else {}
+        self.db_file = os.environ.get("ISSA_DB", issa.get("db_file", "C:/Pruef/Sqlite/db/pme.db"))
+        self.profile_name = os.environ.get("ISSA_PROFILE", issa.get("profile", "station"))
+        self.busy_retries = int(issa.get("busy_retries", 5))
+        self.busy_backoff = float(issa.get("busy_backoff", 0.05))
+
+        profiles = {name: dict(pragmas) for name, pragmas in PROFILES.items()}
+        for section in parser.sections():
+            if section.startswith("profile:"):
+                name = section.split(":", 1)[1]
+                profiles.setdefault(name, {}).update(
+                    (key, _parse(value)) for key, value in parser[section].items())
+        if self.profile_name not in profiles:
+            raise ValueError(f"Unknown SQLite profile: {self.profile_name}")
+        self.profile = profiles[self.profile_name]
+
+        audit = parser["audit"] if parser.has_section("audit") else {}
+        enabled = os.environ.get("ISSA_AUDIT", audit.get("enabled", "false"))
+        self.audit_enabled = enabled.lower() in ("1", "true", "yes", "on")
+        self.audit_path = os.environ.get("ISSA_AUDIT_FILE", audit.get("path", "C:/Pruef/issa.txt"))
+
+        archive = parser["archive"] if parser.has_section("archive") else {}
+        self.archive_dir = archive.get("dir")
+        self.retention_days = int(archive.get("retention_days", 180))
+
+        instrument = parser["instrumentation"] if parser.has_section("instrumentation") else {}
+        enabled = os.environ.get("ISSA_INSTRUMENT", instrument.get("enabled", "false"))
+        self.instrumentation_enabled = enabled.lower() in ("1", "true", "yes", "on")
+        self.instrumentation_interval = float(instrument.get("interval", 60))
+
+
+def _parse(value: str):
+    """Converts numeric INI values to int."""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+_settings = None
+
+
+def get_settings() -> Settings:
+    """Gets the settings, loading them on first use."""
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+    return _settings
+
+
+def apply_profile(conn, profile: dict) -> None:
+    """
+    Applies the PRAGMAs of a performance profile to a connection.
+
+    Parameters
+        conn    (obj): sqlite3 connection obj
+        profile (dict): PRAGMA name -> value.
+
+    Returns
+        None
+    """
+    for pragma, value in profile.items():
+        conn.execute(f"PRAGMA {pragma} = {value};")
+
+
+def effective_settings(conn) -> dict:
+    """
+    Reads the PRAGMA values actually in effect on a connection.
+
+    Parameters
+        conn (obj): sqlite3 connection obj
+
+    Returns
+        settings (dict): PRAGMA name -> current value.
+    """
+    synchronous = {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"}
+    temp_store = {0: "DEFAULT", 1: "FILE", 2: "MEMORY"}
+    settings = {pragma: conn.execute(f"PRAGMA {pragma};").fetchone()[0] for pragma in PRAGMAS}
+    settings["synchronous"] = synchronous.get(settings["synchronous"], settings["synchronous"])
+    settings["temp_store"] = temp_store.get(settings["temp_store"], settings["temp_store"])
+    return settings
+
+
+if "__main__" == __name__:
+    from connection import get_manager
+
+    settings = get_settings()
+    print(f"DB file: {settings.db_file}")
+    print(f"Profile: {settings.profile_name}")
+    print(f"Log archive: {settings.archive_dir or '<DB folder>/archive'}, after {settings.retention_days} days")
+    for pragma, value in get_manager(settings.db_file).effective_settings().items():
+        print(f"    {pragma} = {value}")
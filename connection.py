@@ -0,0 +1,464 @@
+"""Connection management for the ISSA tables."""
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from sqlite3 import Connection, OperationalError
+
+from config import apply_profile, effective_settings, get_settings
+
+
+class ConnectionManager:
+    """
+    A class to share SQLite connections between all the ISSA tables.
+
+    Every thread owns one connection which is reused by all the table classes for
+    writing. Read only queries borrow a connection from a small bounded pool, unless
+    the calling thread is inside a session or a transaction, then its own connection
+    is used so it can read its uncommitted writes.
+
+    Write transactions start with BEGIN IMMEDIATE, if the DB is locked by another
+    process the BEGIN is retried with an exponential backoff on top of the profile
+    busy_timeout.
+
+    Attributes:
+        db_file         (str): Path to the SQLite DB.
+        pool_size       (int): Max number of idle reader connections kept open.
+        profile         (dict): PRAGMA name -> value applied on every connection.
+        busy_retries    (int): Retries of BEGIN on a locked DB.
+        busy_backoff    (float): First retry delay in seconds, doubled every retry.
+        opened          (int): Number of connections opened so far.
+        factory         (type): sqlite3.Connection subclass of the new connections.
+
+    Methods:
+        connection():
+            Gets the connection owned by the calling thread.
+        transaction():
+            Context manager for a single write transaction.
+        savepoint(conn):
+            Context manager for a savepoint inside the current transaction.
+        reader():
+            Context manager lending a connection for read only queries.
+        session():
+            Context manager sharing one connection and one transaction.
+        after_commit(callback):
+            Runs callback once the pending transaction is committed.
+        close():
+            Closes the connection owned by the calling thread.
+        close_all():
+            Closes every connection opened by the manager.
+        effective_settings():
+            Reads the PRAGMA values in effect on the calling thread connection.
+        set_trace_callback(callback):
+            Calls callback(statement) for every SQL statement run on the connections.
+        set_factory(factory):
+            Opens the next connections with a sqlite3.Connection subclass.
+    """
+    def __init__(self,
+                 db_file: str,
+                 pool_size: int = 4,
+                 profile: dict = None,
+                 busy_retries: int = 5,
+                 busy_backoff: float = 0.05) -> None:
+        self.db_file = db_file
+        self.pool_size = pool_size
+        self.profile = profile or {}
+        self.busy_retries = busy_retries
+        self.busy_backoff = busy_backoff
+        self._local = threading.local()
+        self._readers = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+        self._connections = []
+        self._generation = 0
+        self._trace_callback = _trace_callback
+        self.opened = 0
+        self.factory = _connection_factory
+
+
+    def _open(self) -> Connection:
+        """Opens a new connection and keeps track of it."""
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, factory=self.factory)
+        try:
+            apply_profile(conn, self.profile)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        with self._lock:
+            self._connections.append(conn)
+            self.opened += 1
+            conn.set_trace_callback(self._trace_callback)
+        return conn
+
+
+    def _release(self, conn: Connection) -> None:
+        """Closes a connection and stops tracking it."""
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+
+    def _begin(self, conn: Connection) -> None:
+        """Starts a write transaction, retrying with backoff while the DB is locked."""
+        delay = self.busy_backoff
+        for attempt in range(self.busy_retries + 1):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except OperationalError as err:
+                if attempt == self.busy_retries or "locked" not in str(err) and "busy" not in str(err):
+                    raise
+                time.sleep(delay)
+                delay *= 2
+
+
+    @property
+    def in_session(self) -> bool:
+        """True if the calling thread is inside a session."""
+        return getattr(self._local, "depth", 0) > 0
+
+
+    def connection(self) -> Connection:
+        """
+        Gets the connection owned by the calling thread.
+
+        The connection is opened on first use and reused afterwards.
+
+        Returns
+            conn (obj): sqlite3 connection obj
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.generation != self._generation:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.generation = self._generation
+            self._local.depth = 0
+        return conn
+
+
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager for a single write transaction.
+
+        The transaction is committed on exit, or rolled back if an exception is raised.
+        Inside a session or another transaction it becomes a savepoint, so a failure only
+        discards its own changes and the enclosing block decides on the commit.
+
+        Yields
+            conn (obj): sqlite3 connection obj
+        """
+        conn = self.connection()
+        if self.in_session or conn.in_transaction:
+            if not conn.in_transaction:
+                self._begin(conn)
+            with self.savepoint(conn):
+                yield conn
+            return
+
+        self._begin(conn)
+        try:
+            yield conn
+        except BaseException:
+            self._end(conn, commit=False)
+            raise
+        else:
+            self._end(conn, commit=True)
+
+
+    @contextmanager
+    def savepoint(self, conn: Connection):
+        """
+        Context manager for a savepoint inside the current transaction.
+
+        Changes done inside the savepoint are discarded if an exception is raised.
+
+        Parameters
+            conn (obj): sqlite3 connection obj, must be in a transaction.
+
+        Yields
+            conn (obj): sqlite3 connection obj
+        """
+        self._local.savepoints = getattr(self._local, "savepoints", 0) + 1
+        name = f"issa_{self._local.savepoints}"
+        conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute(f"ROLLBACK TO {name}")
+            conn.execute(f"RELEASE {name}")
+            raise
+        else:
+            conn.execute(f"RELEASE {name}")
+        finally:
+            self._local.savepoints -= 1
+
+
+    @contextmanager
+    def reader(self):
+        """
+        Context manager lending a connection for read only queries.
+
+        Yields
+            conn (obj): sqlite3 connection obj
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation == self._generation \
+                and (self.in_session or conn.in_transaction):
+            yield conn
+            return
+
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if type(conn) is not self.factory:
+                # Opened before a factory change.
+                self._release(conn)
+            else:
+                try:
+                    self._readers.put_nowait(conn)
+                except queue.Full:
+                    self._release(conn)
+
+
+    @contextmanager
+    def session(self):
+        """
+        Context manager sharing one connection and one transaction.
+
+        Every table operation done by the calling thread inside the session uses the
+        same connection, and all of them are committed together on exit. If an exception
+        is raised the whole session is rolled back. Sessions can be nested, only the
+        block that started the transaction, the outermost session or an enclosing
+        transaction, commits. Table creation (ISSA.create) is refused inside a session,
+        its script would commit the pending work.
+
+        Yields
+            conn (obj): sqlite3 connection obj
+        """
+        conn = self.connection()
+        began = not conn.in_transaction
+        if began:
+            self._begin(conn)
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            if began:
+                self._end(conn, commit=False)
+            raise
+        else:
+            if began:
+                self._end(conn, commit=True)
+        finally:
+            self._local.depth -= 1
+
+
+    def after_commit(self, callback) -> None:
+        """
+        Runs callback once the pending transaction of the calling thread is committed.
+
+        The callback is discarded if the transaction is rolled back, and runs right
+        away if there is no pending transaction.
+
+        Parameters
+            callback (callable): Function without arguments.
+
+        Returns
+            None
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or not conn.in_transaction:
+            callback()
+            return
+        if not hasattr(self._local, "hooks"):
+            self._local.hooks = []
+        self._local.hooks.append(callback)
+
+
+    def _end(self, conn: Connection, commit: bool) -> None:
+        """Commits or rolls back the thread transaction and runs its hooks."""
+        hooks = getattr(self._local, "hooks", [])
+        self._local.hooks = []
+        if not commit:
+            conn.rollback()
+            return
+        conn.commit()
+        for hook in hooks:
+            hook()
+
+
+    def close(self) -> None:
+        """Closes the connection owned by the calling thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            self._release(conn)
+
+
+    def close_all(self) -> None:
+        """
+        Closes every connection opened by the manager.
+
+        Threads holding a connection will transparently open a new one on next use.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        while True:
+            try:
+                self._readers.get_nowait()
+            except queue.Empty:
+                break
+        for conn in connections:
+            conn.close()
+
+
+    def effective_settings(self) -> dict:
+        """
+        Reads the PRAGMA values in effect on the calling thread connection.
+
+        Returns
+            settings (dict): PRAGMA name -> current value.
+        """
+        return effective_settings(self.connection())
+
+
+    def set_trace_callback(self, callback) -> None:
+        """
+        Calls callback(statement) for every SQL statement run on the connections.
+
+        Parameters
+            callback (callable): Statement callback, None to stop tracing.
+
+        Returns
+            None
+        """
+        with self._lock:
+            self._trace_callback = callback
+            for conn in self._connections:
+                conn.set_trace_callback(callback)
+
+
+    def set_factory(self, factory) -> None:
+        """
+        Opens the next connections with a sqlite3.Connection subclass.
+
+        Idle readers are closed now, borrowed ones when they are given back. The
+        connections owned by the threads are left alone, they may hold a session.
+
+        Parameters
+            factory (type): sqlite3.Connection subclass.
+
+        Returns
+            None
+        """
+        self.factory = factory
+        while True:
+            try:
+                conn = self._readers.get_nowait()
+            except queue.Empty:
+                break
+            self._release(conn)
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+_trace_callback = None
+_connection_factory = sqlite3.Connection
+
+
+def get_manager(db_file: str) -> ConnectionManager:
+    """
+    Gets the connection manager shared by every table of a DB file.
+
+    The manager applies the performance profile of the settings (see config.py).
+
+    Parameters
+        db_file (str): Path to the SQLite DB.
+
+    Returns
+        manager (ConnectionManager): Shared connection manager.
+    """
+    with _managers_lock:
+        manager = _managers.get(db_file)
+        if manager is None:
+            settings = get_settings()
+            manager = _managers[db_file] = ConnectionManager(
+                db_file,
+                profile=settings.profile,
+                busy_retries=settings.busy_retries,
+                busy_backoff=settings.busy_backoff)
+        return manager
+
+
+def _forget_managers() -> None:
+    """Drops the managers inherited from the parent process, SQLite handles must not cross a fork."""
+    global _managers, _managers_lock
+    _managers = {}
+    _managers_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_managers)
+
+
+def get_managers() -> list:
+    """Gets the managers of every DB file opened by this process."""
+    with _managers_lock:
+        return list(_managers.values())
+
+
+def set_trace_callback(callback) -> None:
+    """
+    Calls callback(statement) for every SQL statement run on any DB file.
+
+    Parameters
+        callback (callable): Statement callback, None to stop tracing.
+
+    Returns
+        None
+    """
+    global _trace_callback
+    _trace_callback = callback
+    for manager in get_managers():
+        manager.set_trace_callback(callback)
+
+
+def set_connection_factory(factory) -> None:
+    """
+    Opens the next connections of every DB file with a sqlite3.Connection subclass,
+    e.g. the profiler's.
+
+    Only new connections use it: the reader pools are renewed, the connections owned
+    by threads keep their class until they are closed (see ConnectionManager.set_factory).
+
+    Parameters
+        factory (type): sqlite3.Connection subclass, sqlite3.Connection to restore.
+
+    Returns
+        None
+    """
+    global _connection_factory
+    _connection_factory = factory
+    for manager in get_managers():
+        manager.set_factory(factory)
+
+
+@atexit.register
+def close_all() -> None:
+    """Closes the connections of every DB file."""
+    with _managers_lock:
+        managers = list(_managers.values())
+    for manager in managers:
+        manager.close_all()
@@ -0,0 +1,53 @@
+"""Constant memory Excel writer for large reports."""
+
+MAX_ROWS = 1048576
+MAX_SHEET_NAME = 31
+
+
+def write_sheets(path: str, sheets, progress=None) -> int:
+    """
+    Writes sheets of rows to a workbook without holding them in memory.
+
+    Uses the openpyxl write-only workbook, every row is serialized as soon as it is
+    received, so memory stays bounded whatever the number of rows. A sheet exceeding
+    the Excel row limit is continued in "<name> (2)", "<name> (3)", ...
+
+    Parameters
+        path        (str): Workbook path.
+        sheets      (iterable): (sheet_name, columns, chunks) tuples, chunks being an
+                                iterable of row lists, e.g. ISSA.stream().
+        progress    (callable): Called as progress(rows) after every chunk, an exception
+                                raised by it aborts the report before anything is saved.
+
+    Returns
+        rows (int): Number of data rows written.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    total = 0
+    for sheet_name, columns, chunks in sheets:
+        part = 1
+        sheet = _new_sheet(workbook, sheet_name, part, columns)
+        sheet_rows = 1
+        for rows in chunks:
+            for row in rows:
+                if sheet_rows == MAX_ROWS:
+                    part += 1
+                    sheet = _new_sheet(workbook, sheet_name, part, columns)
+                    sheet_rows = 1
+                sheet.append(row)
+                sheet_rows += 1
+            total += len(rows)
+            if progress:
+                progress(total)
+    workbook.save(path)
+    return total
+
+
+def _new_sheet(workbook, sheet_name: str, part: int, columns: list):
+    """Creates a sheet with its header row."""
+    suffix = f" ({part})" if part > 1 else ""
+    sheet = workbook.create_sheet(sheet_name[:MAX_SHEET_NAME - len(suffix)] + suffix)
+    sheet.append(columns)
+    return sheet
@@ -0,0 +1,101 @@
+"""Streaming CSV and Parquet writers for large exports."""
+
+import csv
+import gzip
+
+ROW_GROUP_SIZE = 100000
+
+
+def write_csv(path: str, columns: list, chunks, progress=None) -> int:
+    """
+    Writes chunks of rows to a CSV file as they are received.
+
+    The file is gzip compressed if path ends with .gz.
+
+    Parameters
+        path        (str): CSV path.
+        columns     (list): Header row.
+        chunks      (iterable): Row lists, e.g. ISSA.stream().
+        progress    (callable): Called as progress(rows) after every chunk.
+
+    Returns
+        rows (int): Number of data rows written.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    total = 0
+    with opener(path, "wt", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(rows)
+            total += len(rows)
+            if progress:
+                progress(total)
+    return total
+
+
+def write_parquet(path: str,
+                  columns: list,
+                  chunks,
+                  types: list,
+                  compression: str = "zstd",
+                  row_group_size: int = ROW_GROUP_SIZE,
+                  progress=None) -> int:
+    """
+    Writes chunks of rows to a Parquet file, one row group per row_group_size rows.
+
+    Only one row group is held in memory. Needs pyarrow, imported on first use.
+
+    Parameters
+        path            (str): Parquet path.
+        columns         (list): Column names.
+        chunks          (iterable): Row lists, e.g. ISSA.stream().
+        types           (list): Column types: string, int64, float64, bool or timestamp
+                                ('YYYY-MM-DD HH:MM:SS' strings).
+        compression     (str): zstd, snappy, gzip, lz4, brotli or none.
+        row_group_size  (int): Rows per row group.
+        progress        (callable): Called as progress(rows) after every chunk.
+
+    Returns
+        rows (int): Number of data rows written.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as err:
+        raise ImportError("Parquet export needs pyarrow: pip install pyarrow") from err
+
+    arrow_types = {
+        "string": pa.string(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "bool": pa.bool_(),
+        "timestamp": pa.timestamp("s"),
+    }
+    schema = pa.schema([(name, arrow_types[kind]) for name, kind in zip(columns, types)])
+
+    def table(rows):
+        arrays = []
+        for values, field in zip(zip(*rows), schema):
+            if field.type == pa.timestamp("s"):
+                arrays.append(pa.array(values, pa.string()).cast(field.type))
+            elif field.type == pa.bool_():
+                arrays.append(pa.array([None if value is None else bool(value) for value in values], field.type))
+            else:
+                arrays.append(pa.array(values, field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    total = 0
+    pending = []
+    with pq.ParquetWriter(path, schema, compression=compression) as writer:
+        for rows in chunks:
+            pending.extend(rows)
+            total += len(rows)
+            if len(pending) >= row_group_size:
+                writer.write_table(table(pending), row_group_size=row_group_size)
+                pending = []
+            if progress:
+                progress(total)
+        if pending:
+            writer.write_table(table(pending), row_group_size=row_group_size)
+    return total
@@ -0,0 +1,274 @@
+"""Latency, row count and SQL statement instrumentation of the ISSA tables.
+
+Turned off by default: an instrumented method then only checks one flag. Turn it on
+from issa.ini ([instrumentation] enabled = true) or with enable():
+
+    import instrumentation
+    instrumentation.enable(interval=60)          # one summary line a minute
+    ...
+    print(instrumentation.format_summary())
+"""
+
+import functools
+import inspect
+import threading
+import time
+from collections import Counter
+
+import connection
+
+# Latency buckets: bucket i counts the calls faster than 2**i microseconds.
+BUCKETS = 26
+
+_enabled = False
+_lock = threading.Lock()
+_stats = {}
+_statements = Counter()
+_trace = None
+_reporter = None
+
+
+class Histogram:
+    """
+    A class to represent the latency histogram of one method.
+
+    Attributes:
+        calls   (int): Number of calls.
+        errors  (int): Calls that raised an exception.
+        rows    (int): Rows returned or inserted by all the calls.
+        total   (float): Sum of the latencies in seconds.
+        max     (float): Slowest call in seconds.
+        buckets (list): Call counts per power of two microseconds.
+
+    Methods:
+        record(seconds, rows, error):
+            Adds one call.
+        quantile(q):
+            Approximate latency quantile in seconds.
+    """
+    __slots__ = ("calls", "errors", "rows", "total", "max", "buckets")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * BUCKETS
+
+
+    def record(self, seconds: float, rows: int = 0, error: bool = False) -> None:
+        """Adds one call."""
+        self.calls += 1
+        self.errors += error
+        self.rows += rows
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[min(BUCKETS - 1, int(seconds * 1e6).bit_length())] += 1
+
+
+    def quantile(self, q: float) -> float:
+        """
+        Approximate latency quantile, the upper bound of its bucket.
+
+        Parameters
+            q (float): Quantile, e.g. 0.95.
+
+        Returns
+            seconds (float): Latency in seconds.
+        """
+        rank = q * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(self.max, (2 ** index) / 1e6)
+        return self.max
+
+
+def _rows(result) -> int:
+    """Rows of a method result: list length, inserted rows or one row."""
+    if result is None or isinstance(result, bool):
+        return 0
+    if hasattr(result, "inserted"):
+        return result.inserted
+    if isinstance(result, list):
+        return len(result)
+    return 1
+
+
+def _record(name: str, seconds: float, rows: int, error: bool) -> None:
+    with _lock:
+        histogram = _stats.get(name)
+        if histogram is None:
+            histogram = _stats[name] = Histogram()
+        histogram.record(seconds, rows, error)
+
+
+def timed(func):
+    """
+    Records the latency and rows of a table method, keyed Class.method.
+
+    Generators are timed from the first to the last chunk, and their rows counted
+    chunk by chunk.
+    """
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(self, *args, **kwargs):
+            if not _enabled:
+                yield from func(self, *args, **kwargs)
+                return
+            name = f"{type(self).__name__}.{func.__name__}"
+            start = time.perf_counter()
+            rows, error = 0, True
+            try:
+                for item in func(self, *args, **kwargs):
+                    rows += len(item) if isinstance(item, list) else 1
+                    yield item
+                error = False
+            except GeneratorExit:
+                # The caller stopped reading early.
+                error = False
+                raise
+            finally:
+                _record(name, time.perf_counter() - start, rows, error)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if not _enabled:
+            return func(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            result = func(self, *args, **kwargs)
+        except BaseException:
+            _record(f"{type(self).__name__}.{func.__name__}", time.perf_counter() - start, 0, True)
+            raise
+        _record(f"{type(self).__name__}.{func.__name__}", time.perf_counter() - start, _rows(result), False)
+        return result
+    return wrapper
+
+
+def _on_statement(statement: str) -> None:
+    """Trace callback of every connection, counts statements by verb."""
+    words = statement.split(None, 2)
+    # Statements run by triggers are traced as "-- <statement>".
+    verb = (words[1] if words[0] == "--" and len(words) > 1 else words[0]).upper() if words else ""
+    with _lock:
+        _statements[verb] += 1
+    if _trace is not None:
+        _trace(statement)
+
+
+def enable(trace=None, interval: float = None, sink=print) -> None:
+    """
+    Turns the instrumentation on.
+
+    Parameters
+        trace       (callable): Called as trace(statement) for every SQL statement.
+        interval    (float): Seconds between two summary lines, no reporter if None.
+        sink        (callable): Receives the summary lines, print by default.
+
+    Returns
+        None
+    """
+    global _enabled, _trace, _reporter
+    _trace = trace
+    _enabled = True
+    connection.set_trace_callback(_on_statement)
+    if interval and _reporter is None:
+        _reporter = _Reporter(interval, sink)
+        _reporter.start()
+
+
+def disable() -> None:
+    """Turns the instrumentation off, the statistics are kept."""
+    global _enabled, _trace, _reporter
+    _enabled = False
+    _trace = None
+    connection.set_trace_callback(None)
+    if _reporter is not None:
+        _reporter.stop()
+        _reporter = None
+
+
+def is_enabled() -> bool:
+    """True while the instrumentation is on."""
+    return _enabled
+
+
+def reset() -> None:
+    """Forgets every statistic."""
+    with _lock:
+        _stats.clear()
+        _statements.clear()
+
+
+def summary() -> dict:
+    """
+    Gets the statistics collected so far.
+
+    Returns
+        summary (dict): methods (Class.method -> calls, errors, rows, rows_per_call,
+                        mean_ms, p50_ms, p95_ms, p99_ms, max_ms), statements (verb ->
+                        count) and connections_opened (DB file -> count).
+    """
+    with _lock:
+        methods = {name: {
+            "calls": histogram.calls,
+            "errors": histogram.errors,
+            "rows": histogram.rows,
+            "rows_per_call": histogram.rows / histogram.calls,
+            "mean_ms": histogram.total / histogram.calls * 1000,
+            "p50_ms": histogram.quantile(0.5) * 1000,
+            "p95_ms": histogram.quantile(0.95) * 1000,
+            "p99_ms": histogram.quantile(0.99) * 1000,
+            "max_ms": histogram.max * 1000,
+        } for name, histogram in _stats.items() if histogram.calls}
+        statements = dict(_statements)
+    connections = {manager.db_file: manager.opened for manager in connection.get_managers()}
+    return {"methods": methods, "statements": statements, "connections_opened": connections}
+
+
+def format_summary(data: dict = None) -> str:
+    """
+    Formats the statistics as one log line.
+
+    Parameters
+        data (dict): summary(), the current one if None.
+
+    Returns
+        line (str): e.g. "issa ProductTable.fetch n=12 p50=0.1ms p95=0.4ms rows/call=3.0 | ..."
+    """
+    data = data or summary()
+    parts = [f"{name} n={item['calls']} p50={item['p50_ms']:.2f}ms p95={item['p95_ms']:.2f}ms "
+             f"max={item['max_ms']:.2f}ms rows/call={item['rows_per_call']:.1f}"
+             + (f" errors={item['errors']}" if item["errors"] else "")
+             for name, item in sorted(data["methods"].items())]
+    statements = " ".join(f"{verb}={count}" for verb, count in sorted(data["statements"].items()))
+    connections = sum(data["connections_opened"].values())
+    return f"issa {' | '.join(parts)} || statements {statements} || connections opened={connections}"
+
+
+class _Reporter:
+    """Background thread sending format_summary() to a sink every interval."""
+
+    def __init__(self, interval: float, sink) -> None:
+        self.interval = interval
+        self.sink = sink
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="issa-instrumentation", daemon=True)
+
+
+    def start(self) -> None:
+        self._thread.start()
+
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sink(format_summary())
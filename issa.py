@@ -2,9 +2,174 @@
 
 import os
 import sqlite3
+from collections import namedtuple
+from itertools import chain, groupby
+from operator import itemgetter
 from sqlite3 import Connection, Error
 from sqlite3.dbapi2 import IntegrityError
 
+import audit
+import cache
+import instrumentation
+from audit import get_audit_log
+from config import get_settings
+from connection import get_manager
+from instrumentation import timed
+
+
+settings = get_settings()
+DB_FILE = settings.db_file
+
+if settings.audit_enabled:
+    audit.configure(True, path=settings.audit_path)
+
+if settings.instrumentation_enabled:
+    instrumentation.enable(interval=settings.instrumentation_interval)
+
+InsertResult = namedtuple("InsertResult", ["inserted", "rejected"])
+
+FREQUENCY_TOLERANCE = 0.05
+
+# (category, name fragment) rules of Test.category, the first matching rule wins.
+TEST_CATEGORIES = [
+    ("did", "did"),
+]
+DEFAULT_TEST_CATEGORY = "general"
+
+
+def session(db_file: str = DB_FILE):
+    """
+    Shares one connection and one transaction between all the tables of a DB file.
+
+    Usage
+        with issa.session():
+            ProductTable().insert(...)
+            ProductTestTable().insert_product_test(...)
+
+    Parameters
+        db_file (str): Path to the SQLite DB.
+
+    Returns
+        session (contextmanager): Session scope, commits on exit.
+    """
+    return get_manager(db_file).session()
+
+
+def insert_sql(table_name: str, columns: tuple) -> str:
+    """
+    Builds a parameterized INSERT statement.
+
+    Parameters
+        table_name  (str): DB table name.
+        columns     (tuple): Column names.
+
+    Returns
+        query (str): INSERT statement with one placeholder per column.
+    """
+    cols = ", ".join(f'"{col}"' for col in columns)
+    values = ", ".join("?" * len(columns))
+    return f"INSERT INTO {table_name} ({cols}) VALUES ({values})"
+
+
+def classify_test(name: str) -> str:
+    """
+    Gets the category of a test from its name, see TEST_CATEGORIES.
+
+    Parameters
+        name (str): Test name.
+
+    Returns
+        category (str): Test category, e.g. did.
+    """
+    name = name.lower()
+    for category, fragment in TEST_CATEGORIES:
+        if fragment in name:
+            return category
+    return DEFAULT_TEST_CATEGORY
+
+
+def test_category_sql(column: str = "name") -> str:
+    """SQL CASE expression computing classify_test() of a name column."""
+    rules = " ".join(f"WHEN lower({column}) LIKE '%{fragment}%' THEN '{category}'"
+                     for category, fragment in TEST_CATEGORIES)
+    return f"CASE {rules} ELSE '{DEFAULT_TEST_CATEGORY}' END"
+
+
+def serial_conditions(column: str,
+                      serial_numbers: list = None,
+                      serial_range: tuple = None,
+                      product_type: str = None,
+                      chunk_size: int = 500):
+    """
+    Yields parameterized WHERE conditions selecting products by serial number.
+
+    A serial number list is split into sorted chunks of chunk_size, one condition per
+    chunk, so each chunk holds complete serials. Range and product type conditions
+    are combined with AND. Without any filter every product is selected.
+
+    Parameters
+        column          (str): Serial number column of the query, e.g. "pb.serial_number".
+        serial_numbers  (list): Serial numbers.
+        serial_range    (tuple): (first, last) serial numbers, both included.
+        product_type    (str): Product.type of the products.
+        chunk_size      (int): Max serial numbers per IN list.
+
+    Yields
+        (where, params) (tuple): SQL condition and its parameters.
+    """
+    conditions, params = [], []
+    if serial_range:
+        conditions.append(f"{column} BETWEEN ? AND ?")
+        params.extend(serial_range)
+    if product_type:
+        conditions.append(f"{column} IN (SELECT serial_number FROM Product WHERE type = ?)")
+        params.append(product_type)
+
+    if serial_numbers is None:
+        yield " AND ".join(conditions) or "1", params
+        return
+
+    serial_numbers = sorted(set(serial_numbers))
+    for start in range(0, len(serial_numbers), chunk_size):
+        chunk = serial_numbers[start:start + chunk_size]
+        where = f"{column} IN ({', '.join('?' * len(chunk))})"
+        yield " AND ".join([where] + conditions), chunk + params
+
+
+def schema_version(conn) -> int:
+    """
+    Gets the schema version of a DB, changed by every CREATE, DROP or ALTER.
+
+    Parameters
+        conn (obj): sqlite3 connection obj
+
+    Returns
+        version (int): PRAGMA schema_version.
+    """
+    return conn.execute("PRAGMA schema_version;").fetchone()[0]
+
+
+def time_window(column: str, start: str = None, end: str = None) -> tuple:
+    """
+    Builds the parameterized condition of a created_on range, start included, end excluded.
+
+    Parameters
+        column  (str): Timestamp column of the query, e.g. "pb.created_on".
+        start   (str): First timestamp, 'YYYY-MM-DD HH:MM:SS' UTC, open if None.
+        end     (str): End timestamp, excluded, open if None.
+
+    Returns
+        (where, params) (tuple): SQL condition and its parameters.
+    """
+    conditions, params = [], []
+    if start:
+        conditions.append(f"{column} >= ?")
+        params.append(start)
+    if end:
+        conditions.append(f"{column} < ?")
+        params.append(end)
+    return " AND ".join(conditions) or "1", params
+
 
 class ISSA:
     """
@@ -14,65 +179,87 @@ class ISSA:
         db_file     (str): Path to the SQLite DB.
         table_name  (str): Name of the DB table for a child class.
         primary_key (str): Name of the DB table primary key.
+        manager     (ConnectionManager): Connections shared by all tables of db_file.
 
     Methods:
         create_connection():
-            definition
+            Gets the connection owned by the calling thread.
+        session():
+            Shares one connection and one transaction until the scope exits.
         create(create_table_sql):
             Executes the provided SQL script to create a table
         drop():
             Drops the DB table from the calling subclass.
         insert():
             Insert data into the database.
+        insert_many(table_name, rows, columns):
+            Inserts rows in one transaction, one executemany per column shape.
         fetch():
             Fetches all data from the input query.
+        stream():
+            Streams the rows of the input query in chunks.
         get_last_row():
             Gets the last row of the calling child class.
         is_valid():
             Looks if the pk_value exists in the calling child class DB table_name.
     """
-    def __init__(self, db_file: str = "C:/Pruef/Sqlite/db/pme.db") -> None:
+    def __init__(self, db_file: str = DB_FILE) -> None:
         self.db_file = db_file
         self.cwd = os.getcwd()
         self.table_name = ""
         self.primary_key = "id"
-        self.create_connection()
+        self.manager = get_manager(db_file)
 
 
     def create_connection(self) -> Connection:
         """
-        Create a db connection
+        Gets the db connection owned by the calling thread.
+
+        The connection is shared by every table of the same db_file, do not close it.
 
         Returns
             conn (obj): sqlite3 connection obj
         """
-        conn = None
         try:
-            conn = sqlite3.connect(self.db_file)
-            return conn
+            return self.manager.connection()
         except Error as err:
             print(err)
             return None
 
 
+    def session(self):
+        """
+        Shares one connection and one transaction until the scope exits.
+
+        Returns
+            session (contextmanager): Session scope, commits on exit.
+        """
+        return self.manager.session()
+
+
+    @timed
     def create(self, create_table_sql: str) -> None:
         """
         Executes the provided SQL script to create a table.
 
+        executescript() commits the pending transaction first, so it cannot run inside
+        a session without breaking it.
+
         Parameters
             create_table_sql (str): SQL script
 
         Returns
             None
         """
+        if self.manager.in_session:
+            raise RuntimeError("Tables cannot be created inside a session")
         try:
-            with self.create_connection() as conn:
-                cur = conn.cursor()
-                cur.executescript(create_table_sql)
+            self.manager.connection().executescript(create_table_sql)
         except Error as err:
             print(err)
 
 
+    @timed
     def drop(self) -> None:
         """
         Drops the DB table from the calling subclass.
@@ -86,14 +273,16 @@ class ISSA:
             None
         """
         try:
-            with self.create_connection() as conn:
+            with self.manager.transaction() as conn:
                 cur = conn.cursor()
                 cur.execute(f"DROP TABLE IF EXISTS {self.table_name};")
         except Error as err:
             print(err)
+        cache.invalidate(self.db_file, self.table_name)
 
 
-    def insert(self, table_data) -> None:
+    @timed
+    def insert(self, table_data) -> InsertResult:
         """
         Inserts data into the db.
 
@@ -101,28 +290,13 @@ class ISSA:
             table_data  (dict): dict containing the table name and values to insert.
 
         Returns
-            None
-
-        Raises
-            IntegrityError: Let the error by pass.
+            result (InsertResult): Number of inserted and rejected rows.
         """
-        try:
-            with self.create_connection() as conn:
-                cur = conn.cursor()
-                for item in table_data["table_values"]:
-                    cols = tuple(item.keys()) if len(item.keys()) > 1 else str(tuple(item.keys())).replace(",", "")
-                    values = ('?,'*len(item)).rstrip(",")
-                    query=f"INSERT INTO {table_data['table_name']} {cols} VALUES ({values})"
-                    params = tuple(item.values())
-                    cur.execute(query, params)
-                conn.commit()
-        except IntegrityError:
-            pass
-        except Error as err:
-            print(err)
+        return self.insert_many(table_data["table_name"], table_data["table_values"])
 
 
-    def insert_values(self, columns: list, table_data: list) -> None:
+    @timed
+    def insert_values(self, columns: list, table_data: list) -> InsertResult:
         """
         Inserts data from the provided params from TestStand.
 
@@ -131,46 +305,86 @@ class ISSA:
             table_data  (list): Values for the provided columns.
 
         Returns
-            None
+            result (InsertResult): Number of inserted and rejected rows.
         """
 
         columns = columns or []
         table_data = table_data or []
 
+        return self.insert_many(self.table_name, table_data, columns)
+
+
+    @timed
+    def insert_many(self, table_name: str, rows: list, columns: list = None) -> InsertResult:
+        """
+        Inserts rows in one transaction, one executemany per column shape.
+
+        Rows are grouped by their columns, so the INSERT statement of each group is
+        built only once. If a group violates a constraint, the group is replayed row
+        by row and only the offending rows are rejected. Inserted rows are sent to the
+        audit trail when it is enabled (see config.py).
+
+        Parameters
+            table_name  (str): DB table name.
+            rows        (list): dicts of column: value, or value sequences if columns is given.
+            columns     (list): Column names of the value sequences.
+
+        Returns
+            result (InsertResult): Number of inserted and rejected rows.
+        """
+        groups = {}
+        for row in rows:
+            if columns is None:
+                groups.setdefault(tuple(row.keys()), []).append(tuple(row.values()))
+            else:
+                groups.setdefault(tuple(columns), []).append(tuple(row))
+
+        audit_log = get_audit_log()
+        inserted = rejected = 0
         try:
-            with self.create_connection() as conn:
+            with self.manager.transaction() as conn:
                 cur = conn.cursor()
-                columns = tuple(columns)
-                for item in table_data:
-                    columns = columns if len(columns) > 1 else str(columns).replace(',','')
-                    values = ('?,'*len(item)).rstrip(",")
-                    query=f"INSERT INTO {self.table_name} {columns} VALUES ({values})"
-                    params = item
-                    with open("C:/Pruef/issa.txt", 'w', encoding="utf-8") as log:
-                        log.write(query + '\n')
-                        log.write(str(params) + '\n')
-                    cur.execute(query, params)
-                conn.commit()
-        except IntegrityError:
-            pass
+                for cols, params in groups.items():
+                    query = insert_sql(table_name, cols)
+                    try:
+                        with self.manager.savepoint(conn):
+                            cur.executemany(query, params)
+                    except IntegrityError:
+                        accepted = []
+                        for item in params:
+                            try:
+                                cur.execute(query, item)
+                                accepted.append(item)
+                            except IntegrityError:
+                                rejected += 1
+                        params = accepted
+                    inserted += len(params)
+                    if audit_log is not None and params:
+                        audit_log.record(query, params)
+                if inserted and cache.has_listeners(self.db_file, table_name):
+                    self.manager.after_commit(lambda: cache.notify_change(self.db_file, table_name))
         except Error as err:
             print(err)
+            return InsertResult(0, len(rows))
+        return InsertResult(inserted, rejected)
 
 
-    def fetch(self, query) -> list:
+    @timed
+    def fetch(self, query, params: tuple = ()) -> list:
         """
         Fetches all data from the input query.
 
         Parameters
-            query (str): SQL query
+            query   (str): SQL query
+            params  (tuple): Query parameters.
 
         Returns
             rows (list): Fetched rows list
         """
         try:
-            with self.create_connection() as conn:
+            with self.manager.reader() as conn:
                 cur = conn.cursor()
-                cur.execute(query)
+                cur.execute(query, params)
                 rows = cur.fetchall()
                 return rows
         except Error as err:
@@ -178,6 +392,32 @@ class ISSA:
             return None
 
 
+    @timed
+    def stream(self, query: str, params: tuple = (), chunk_size: int = 1000):
+        """
+        Streams the rows of the input query in chunks.
+
+        Only one chunk is held in memory, the first chunk is available as soon as
+        SQLite produces it, before the whole query is evaluated.
+
+        Parameters
+            query       (str): SQL query
+            params      (tuple): Query parameters.
+            chunk_size  (int): Rows per chunk.
+
+        Yields
+            rows (list): Next chunk of rows.
+        """
+        with self.manager.reader() as conn:
+            cur = conn.execute(query, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+
+    @timed
     def get_last_row(self) -> tuple:
         """
         Gets the last row of the calling child class.
@@ -198,7 +438,7 @@ class ISSA:
         LIMIT 1;
         '''
         try:
-            with self.create_connection() as conn:
+            with self.manager.reader() as conn:
                 cur = conn.cursor()
                 cur.execute(query)
                 return cur.fetchone()
@@ -207,6 +447,7 @@ class ISSA:
             return None
 
 
+    @timed
     def is_valid(self, pk_value: str) -> bool:
         """
         Looks if the pk_value exists in the calling child class DB table_name.
@@ -223,7 +464,7 @@ class ISSA:
         WHERE {self.primary_key} is ?;
         '''
         try:
-            with self.create_connection() as conn:
+            with self.manager.reader() as conn:
                 c = conn.cursor()
                 c.execute(query, (pk_value,))
                 last_row = c.fetchone()
@@ -234,9 +475,80 @@ class ISSA:
             return False
 
 
+    def _cached_id(self, name: str) -> int:
+        """
+        Gets the id of a name from the table cache, querying the table on a miss.
+
+        Parameters
+            name (str): Value of the name column.
+
+        Returns
+            id (int): Row id, None if name does not exist.
+        """
+        table_cache = cache.get_cache(self.db_file, self.table_name)
+        query = f"""
+            SELECT (id) FROM {self.table_name} WHERE name = ?;
+        """
+        try:
+            with self.manager.reader() as conn:
+                table_cache.validate(schema_version(conn))
+                row_id = table_cache.get(name)
+                if row_id is not None:
+                    return row_id
+                row = conn.execute(query, (name,)).fetchone()
+        except Error as err:
+            print(err)
+            return None
+        if row is None:
+            return None
+        self.manager.after_commit(lambda: table_cache.update({name: row[0]}))
+        return row[0]
+
+
+    def _resolve_names(self, rows: dict, columns: tuple) -> dict:
+        """
+        Gets the ids of the rows by name, creating the missing ones.
+
+        Known names are served from the process-wide cache, the missing ones are
+        upserted with one executemany and fetched back by name. The cache is checked
+        against the schema version inside the write transaction, so ids of a table
+        dropped and created again by another process are never handed out.
+
+        Parameters
+            rows    (dict): name -> values for columns, the first column being name.
+            columns (tuple): Column names of the values.
+
+        Returns
+            ids (dict): name -> id.
+        """
+        table_cache = cache.get_cache(self.db_file, self.table_name)
+        query = insert_sql(self.table_name, columns) + " ON CONFLICT(name) DO NOTHING"
+        with self.manager.transaction() as conn:
+            table_cache.validate(schema_version(conn))
+            ids = table_cache.get_many(rows)
+            missing = {name: values for name, values in rows.items() if name not in ids}
+            if not missing:
+                return ids
+
+            names = list(missing)
+            fetched = {}
+            cur = conn.cursor()
+            cur.executemany(query, list(missing.values()))
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                cur.execute(f"""
+                    SELECT name, id FROM {self.table_name}
+                    WHERE name IN ({", ".join("?" * len(chunk))});
+                """, chunk)
+                fetched.update(cur.fetchall())
+            self.manager.after_commit(lambda: table_cache.update(fetched))
+        ids.update(fetched)
+        return ids
+
+
 class ProductTable(ISSA):
-    def __init__(self, table_name: str = "Product"):
-        super().__init__()
+    def __init__(self, table_name: str = "Product", db_file: str = DB_FILE):
+        super().__init__(db_file)
         self.table_name = table_name
         self.primary_key = "serial_number"
 
@@ -255,9 +567,33 @@ class ProductTable(ISSA):
         super().create(sql)
 
 
+    @timed
+    def get_serial_numbers(self,
+                           serial_numbers: list = None,
+                           serial_range: tuple = None,
+                           product_type: str = None) -> list:
+        """
+        Gets the existing serial numbers matching the filters.
+
+        Parameters
+            serial_numbers  (list): Serial numbers.
+            serial_range    (tuple): (first, last) serial numbers, both included.
+            product_type    (str): Product type.
+
+        Returns
+            serial_numbers (list): Sorted serial numbers.
+        """
+        found = []
+        for where, params in serial_conditions(self.primary_key, serial_numbers, serial_range, product_type):
+            query = f"SELECT {self.primary_key} FROM {self.table_name} WHERE {where} ORDER BY {self.primary_key};"
+            found.extend(row[0] for row in self.fetch(query, params) or [])
+        return found
+
+
+    @timed
     def get_product_dids(self, serial_number: str) -> list:
         """
-        Get all test which includes did in their name from the serial number.
+        Get all the DID tests of a product, see TestTable.category.
 
         Parameters
             serial_number (str): Device serial number.
@@ -266,27 +602,71 @@ class ProductTable(ISSA):
             rows (list): All results.
         """
         query = f"""
-        SELECT 
+        SELECT
             t.name AS 'Test Name',
             t.min_limit AS 'Min Limit',
             t.max_limit AS 'Max Limit',
             t.units AS 'Units'
-        FROM 
-            Test as t
-        INNER JOIN
+        FROM
             Product_Test as pt
+        INNER JOIN
+            Test as t
         ON
             t.id = pt.test_id
         WHERE
-            t.name LIKE '%did%' AND pt.serial_number is '{serial_number}';
+            pt.serial_number = ? AND t.category = 'did'
+        ORDER BY
+            pt.id;
         """
-        rows = self.fetch(query)
+        rows = self.fetch(query, (serial_number,))
         return rows
 
 
+    @timed
+    def iter_product_dids(self,
+                          serial_numbers: list = None,
+                          serial_range: tuple = None,
+                          product_type: str = None):
+        """
+        Streams the DID tests of many products grouped by serial number, one query
+        per 500 serial numbers.
+
+        Parameters
+            serial_numbers  (list): Serial numbers.
+            serial_range    (tuple): (first, last) serial numbers, both included.
+            product_type    (str): Product type.
+
+        Yields
+            (serial_number, rows) (tuple): Serial number and its get_product_dids rows.
+        """
+        for where, params in serial_conditions("pt.serial_number", serial_numbers, serial_range, product_type):
+            query = f"""
+            SELECT
+                pt.serial_number,
+                t.name AS 'Test Name',
+                t.min_limit AS 'Min Limit',
+                t.max_limit AS 'Max Limit',
+                t.units AS 'Units'
+            FROM
+                Product_Test as pt
+            INNER JOIN
+                Test as t
+            ON
+                t.id = pt.test_id
+            WHERE
+                {where} AND t.category = 'did'
+            ORDER BY
+                pt.serial_number, pt.id;
+            """
+            with self.manager.reader() as conn:
+                cur = conn.execute(query, params)
+                for serial_number, rows in groupby(cur, key=itemgetter(0)):
+                    yield serial_number, [row[1:] for row in rows]
+
+
 class BandTable(ISSA):
-    def __init__(self, table_name: str = "Band") -> None:
-        super().__init__()
+    def __init__(self, table_name: str = "Band", db_file: str = DB_FILE) -> None:
+        super().__init__(db_file)
         self.table_name = table_name
 
 
@@ -307,27 +687,51 @@ class BandTable(ISSA):
         super().create(sql)
     
 
-    def is_valid(self, tech: str, band: int, freq: float) -> bool:
+    @timed
+    def is_valid(self, tech: str, band: int, freq: float, tolerance: float = FREQUENCY_TOLERANCE) -> bool:
+        """
+        Looks if the band plan has this frequency, querying the DB.
+
+        Measurement ingestion should use band_index.get_band_index() instead.
+
+        Parameters
+            tech        (str): Technology, e.g. lte.
+            band        (int): Band number.
+            freq        (float): Frequency in MHz.
+            tolerance   (float): Max frequency difference in MHz.
+
+        Returns
+            is_valid (bool): True if the band plan has the frequency.
+        """
         query = f"""
-            SELECT *
+            SELECT 1
             FROM {self.table_name}
-            WHERE tech is '{tech}' AND band is {band} AND frequency is {freq};
+            WHERE tech = ? AND band = ? AND frequency BETWEEN ? AND ?;
         """
         try:
-            with self.create_connection() as conn:
+            with self.manager.reader() as conn:
                 c = conn.cursor()
-                c.execute(query)
-                last_row = c.fetchone()
-                if last_row:
-                    return True
-        except Error:
-            print(Error)
+                c.execute(query, (tech, band, freq - tolerance, freq + tolerance))
+                return c.fetchone() is not None
+        except Error as err:
+            print(err)
             return False
 
 
+    @timed
+    def get_bands(self) -> list:
+        """
+        Gets the whole band plan.
+
+        Returns
+            rows (list): (tech, band, frequency, direction, target) rows.
+        """
+        return self.fetch(f"SELECT tech, band, frequency, direction, target FROM {self.table_name};")
+
+
 class ProductBandTable(ISSA):
-    def __init__(self, table_name: str = "Product_Band"):
-        super().__init__()
+    def __init__(self, table_name: str = "Product_Band", db_file: str = DB_FILE):
+        super().__init__(db_file)
         self.table_name = table_name
         self.create_table_sql = f"""
             CREATE TABLE IF NOT EXISTS {self.table_name}(
@@ -349,23 +753,92 @@ class ProductBandTable(ISSA):
 
 
     def insert_product_band(self, serial_number: str, tech: str, band: int, frequency: float, power: float, units: str) -> None:
-        bt = BandTable()
-        if bt.is_valid(tech, band, frequency):
-            table_data = {
-                "table_name": self.table_name,
-                "table_values": [{
-                    "serial_number": serial_number,
-                    "frequency": frequency,
-                    "power": power,
-                    "units": units,}]
-            }
-            self.insert(table_data)
-        pass
+        self.insert_product_bands([(serial_number, tech, band, frequency, power, units)])
+
+
+    @timed
+    def insert_product_bands(self, measurements: list, power_tolerance: float = 3.0) -> InsertResult:
+        """
+        Inserts a whole RF sweep, of one or many products, in one transaction.
+
+        Every measurement is validated against the in-memory band plan, then the delta
+        to the band target and the pass/fail verdict of the sweep are computed with
+        NumPy and all the valid measurements are written with one executemany.
+        Requires the schema version 3 (see migrations.py).
+
+        Parameters
+            measurements    (list): (serial_number, tech, band, frequency, power, units) tuples.
+            power_tolerance (float): Max |power - target| of a passed measurement, in dB.
+
+        Returns
+            result (InsertResult): Inserted measurements, rejected ones include the
+                                   frequencies missing from the band plan.
+        """
+        import numpy as np
+        from band_index import get_band_index
+
+        index = get_band_index(self.db_file)
+        valid, targets = [], []
+        for measurement in measurements:
+            entry = index.lookup(measurement[1], measurement[2], measurement[3])
+            if entry is not None:
+                valid.append(measurement)
+                targets.append(entry.target)
+        if not valid:
+            return InsertResult(0, len(measurements))
+
+        power = np.array([measurement[4] for measurement in valid], dtype=float)
+        delta = power - np.array(targets, dtype=float)
+        passed = np.abs(delta) <= power_tolerance
+
+        rows = [(serial_number, tech.lower(), band, frequency, power, units, target, step, verdict)
+                for (serial_number, tech, band, frequency, power, units), target, step, verdict
+                in zip(valid, targets, delta.tolist(), passed.astype(int).tolist())]
+        result = self.insert_many(self.table_name, rows, [
+            "serial_number", "tech", "band", "frequency", "power", "units", "target", "delta", "passed"])
+        return InsertResult(result.inserted, result.rejected + len(measurements) - len(valid))
+
+
+    def iter_product_bands(self,
+                           serial_numbers: list = None,
+                           serial_range: tuple = None,
+                           product_type: str = None,
+                           start: str = None,
+                           end: str = None,
+                           chunk_size: int = 1000):
+        """
+        Streams the RF measurements of the selected products and time window.
+
+        Parameters
+            serial_numbers  (list): Serial numbers.
+            serial_range    (tuple): (first, last) serial numbers, both included.
+            product_type    (str): Product type.
+            start           (str): First created_on, 'YYYY-MM-DD HH:MM:SS' UTC.
+            end             (str): End of the window, excluded.
+            chunk_size      (int): Rows per chunk.
+
+        Yields
+            rows (list): Next chunk of (serial_number, tech, band, frequency, power, units,
+                         target, delta, passed, created_on) rows.
+        """
+        by_serial = serial_numbers is not None or serial_range or product_type
+        order = "pb.serial_number, pb.rowid" if by_serial else "pb.created_on, pb.rowid"
+        window, window_params = time_window("pb.created_on", start, end)
+        for where, params in serial_conditions("pb.serial_number", serial_numbers, serial_range, product_type):
+            query = f"""
+            SELECT
+                pb.serial_number, pb.tech, pb.band, pb.frequency, pb.power, pb.units,
+                pb.target, pb.delta, pb.passed, pb.created_on
+            FROM {self.table_name} pb
+            WHERE {where} AND {window}
+            ORDER BY {order};
+            """
+            yield from self.stream(query, tuple(params + window_params), chunk_size)
 
 
 class LogTable(ISSA):
-    def __init__(self, table_name: str = "Log") -> None:
-        super().__init__()
+    def __init__(self, table_name: str = "Log", db_file: str = DB_FILE) -> None:
+        super().__init__(db_file)
         self.table_name = table_name
         self.create_table_sql = f"""
             CREATE TABLE IF NOT EXISTS {self.table_name}(
@@ -385,23 +858,229 @@ class LogTable(ISSA):
         super().create(self.create_table_sql)
 
 
+    def drop(self) -> None:
+        """
+        Drops the table with its full-text index and its monthly archives.
+
+        Returns
+            None
+        """
+        if "." not in self.table_name:
+            from archive import LogArchive
+            LogArchive(self).clear()
+            try:
+                with self.manager.transaction() as conn:
+                    conn.execute(f"DROP TABLE IF EXISTS {self.table_name}_fts;")
+            except Error as err:
+                print(err)
+        super().drop()
+
+
+    def writer(self, batch_size: int = 500, max_latency: float = 0.2):
+        """
+        Starts a group commit writer of this table, see log_writer.LogWriter.
+
+        Parameters
+            batch_size  (int): Max number of records committed at once.
+            max_latency (float): Max seconds a record waits before being committed.
+
+        Returns
+            writer (LogWriter): Running writer, close() it at the end of the sequence.
+        """
+        from log_writer import LogWriter
+        return LogWriter(self, batch_size, max_latency)
+
+
+    @timed
     def get_logs_by_serial_number(self, serial_number: str) -> list:
-        query = f'''
+        archived = [row for rows in self._iter_archived_logs(serial_number) for row in rows]
+        logs = self.fetch(self._logs_query(), (serial_number,))
+        if not archived:
+            return logs
+        return archived + (logs or [])
+
+
+    def iter_logs_by_serial_number(self, serial_number: str, chunk_size: int = 1000):
+        """
+        Streams the logs of a product in chunks.
+
+        Parameters
+            serial_number   (str): Serial Number.
+            chunk_size      (int): Rows per chunk.
+
+        Yields
+            rows (list): Next chunk of log rows.
+        """
+        return chain(self._iter_archived_logs(serial_number, chunk_size),
+                     self.stream(self._logs_query(), (serial_number,), chunk_size))
+
+
+    def iter_logs_between(self, start: str = None, end: str = None, chunk_size: int = 1000):
+        """
+        Streams the logs of every product created in a time window, archived ones first.
+
+        Parameters
+            start       (str): First created_on, 'YYYY-MM-DD HH:MM:SS' UTC.
+            end         (str): End of the window, excluded.
+            chunk_size  (int): Rows per chunk.
+
+        Yields
+            rows (list): Next chunk of log rows, in creation order.
+        """
+        from archive import ARCHIVE_ALIAS, LogArchive
+        archived = LogTable(f"{ARCHIVE_ALIAS}.{self.table_name}", self.db_file)._window_query(start, end)
+        _, params = time_window("l.created_on", start, end)
+        return chain(LogArchive(self).iter_window(start, end, archived, chunk_size),
+                     self.stream(self._window_query(start, end), tuple(params), chunk_size))
+
+
+    @timed
+    def iter_logs(self,
+                  serial_numbers: list = None,
+                  serial_range: tuple = None,
+                  product_type: str = None,
+                  chunk_size: int = 1000):
+        """
+        Streams the logs of the selected products, archived ones first.
+
+        One query per chunk of serial numbers, see serial_conditions.
+
+        Parameters
+            serial_numbers  (list): Serial numbers.
+            serial_range    (tuple): (first, last) serial numbers, both included.
+            product_type    (str): Product type.
+            chunk_size      (int): Rows per chunk.
+
+        Yields
+            rows (list): Next chunk of log rows, by serial number and id.
+        """
+        from archive import ARCHIVE_ALIAS, LogArchive
+        archived = LogTable(f"{ARCHIVE_ALIAS}.{self.table_name}", self.db_file)._selection_query
+        yield from LogArchive(self).iter_selection(serial_numbers, serial_range, product_type, archived, chunk_size)
+        for where, params in serial_conditions("l.serial_number", serial_numbers, serial_range, product_type):
+            yield from self.stream(self._selection_query(where), tuple(params), chunk_size)
+
+
+    def _selection_query(self, where: str) -> str:
+        return f'''
         SELECT
             l.serial_number as 'Serial Number',
             l.type as 'Type',
             l.desc as 'Description',
             l.created_on as 'Creation Date'
-        FROM Log l 
-        WHERE serial_number is '{serial_number}';
+        FROM {self.table_name} l
+        WHERE {where}
+        ORDER BY l.serial_number, l.id;
         '''
-        return self.fetch(query)
 
 
+    def _window_query(self, start: str = None, end: str = None) -> str:
+        where, _ = time_window("l.created_on", start, end)
+        return f'''
+        SELECT
+            l.serial_number as 'Serial Number',
+            l.type as 'Type',
+            l.desc as 'Description',
+            l.created_on as 'Creation Date'
+        FROM {self.table_name} l
+        WHERE {where}
+        ORDER BY l.created_on, l.id;
+        '''
+
+
+    def _iter_archived_logs(self, serial_number: str, chunk_size: int = 1000):
+        """Streams the logs of a product moved to the monthly archives, see archive.py."""
+        from archive import ARCHIVE_ALIAS, LogArchive
+        query = LogTable(f"{ARCHIVE_ALIAS}.{self.table_name}", self.db_file)._logs_query()
+        return LogArchive(self).iter_logs(serial_number, query, chunk_size)
+
+
+    @timed
+    def search(self, query: str, serial_number: str = None, since: str = None,
+               limit: int = 50, raw: bool = False) -> list:
+        """
+        Full-text search of the log descriptions, best matches first.
+
+        Uses the FTS5 index of the schema version 5 (see migrations.py), ranked by
+        bm25, or a LIKE scan if the index is missing. Archived logs are not searched.
+
+        Parameters
+            query           (str): Words that must all appear, or FTS5 syntax if raw.
+            serial_number   (str): Only the logs of this serial number.
+            since           (str): Only the logs created from this date, 'YYYY-MM-DD HH:MM:SS' UTC.
+            limit           (int): Max number of matches.
+            raw             (bool): Pass query as an FTS5 expression (OR, NEAR, prefix*).
+
+        Returns
+            matches (list): (serial_number, type, created_on, snippet, rank) rows.
+        """
+        conditions, params = [], []
+        if serial_number:
+            conditions.append("l.serial_number = ?")
+            params.append(serial_number)
+        if since:
+            conditions.append("l.created_on >= ?")
+            params.append(since)
+        match = query if raw else " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+        if not match:
+            return []
+
+        fts = f"{self.table_name}_fts"
+        sql = f'''
+        SELECT l.serial_number, l.type, l.created_on,
+               snippet({fts}, 0, '[', ']', '...', 16), bm25({fts})
+        FROM {fts}
+        JOIN {self.table_name} l ON l.id = {fts}.rowid
+        WHERE {" AND ".join([f"{fts} MATCH ?"] + conditions)}
+        ORDER BY bm25({fts})
+        LIMIT ?;
+        '''
+        try:
+            with self.manager.reader() as conn:
+                return conn.execute(sql, [match] + params + [limit]).fetchall()
+        except sqlite3.OperationalError as err:
+            if f"no such table: {fts}" not in str(err):
+                print(err)
+                return []
+
+        like = [f"l.\"desc\" LIKE ? ESCAPE '\\'" for _ in query.split()]
+        words = ["%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                 for word in query.split()]
+        sql = f'''
+        SELECT l.serial_number, l.type, l.created_on, l."desc", 0.0
+        FROM {self.table_name} l
+        WHERE {" AND ".join(like + conditions)}
+        ORDER BY l.id DESC
+        LIMIT ?;
+        '''
+        return self.fetch(sql, tuple(words + params + [limit])) or []
+
+
+    def rebuild_search_index(self) -> None:
+        """Rebuilds the full-text index from the Log table, e.g. after a bulk import."""
+        try:
+            with self.manager.transaction() as conn:
+                conn.execute(f"INSERT INTO {self.table_name}_fts({self.table_name}_fts) VALUES ('rebuild');")
+        except Error as err:
+            print(err)
+
+
+    def _logs_query(self) -> str:
+        return f'''
+        SELECT
+            l.serial_number as 'Serial Number',
+            l.type as 'Type',
+            l.desc as 'Description',
+            l.created_on as 'Creation Date'
+        FROM {self.table_name} l
+        WHERE serial_number = ?
+        ORDER BY l.id;
+        '''
+
 
 class BenchmarkTable(ISSA):
-    def __init__(self, table_name: str = "Benchmark") -> None:
-        super().__init__()
+    def __init__(self, table_name: str = "Benchmark", db_file: str = DB_FILE) -> None:
+        super().__init__(db_file)
         self.table_name = table_name
 
 
@@ -428,19 +1107,45 @@ class BenchmarkTable(ISSA):
         Return
             id      (int): Benchmark id of the requested name.
         """
-        query = f"""
-            SELECT (id) FROM {self.table_name} WHERE name = '{name}';
-        """
-        rows = self.fetch(query)
+        return self._cached_id(name)
+
+
+    def warm_cache(self) -> None:
+        """Loads every benchmark name -> id into the process-wide cache."""
+        table_cache = cache.get_cache(self.db_file, self.table_name)
         try:
-            return rows[0][0]
-        except IndexError:
-            pass
+            with self.manager.reader() as conn:
+                version = schema_version(conn)
+                ids = dict(conn.execute(f"SELECT name, id FROM {self.table_name};"))
+        except Error as err:
+            print(err)
+            return
+        table_cache.validate(version)
+        self.manager.after_commit(lambda: table_cache.update(ids, warm=True))
+
+
+    @timed
+    def resolve_ids(self, names: list) -> dict:
+        """
+        Gets the ids of the benchmark names, creating the missing ones.
+
+        The cache is warmed with the whole Benchmark table on first use, so only
+        new step names reach the DB.
+
+        Parameters
+            names (list): Benchmark names.
+
+        Returns
+            ids (dict): Benchmark name -> benchmark id.
+        """
+        if not cache.get_cache(self.db_file, self.table_name).warm:
+            self.warm_cache()
+        return self._resolve_names({name: (name,) for name in names}, ("name",))
 
 
 class ProductBenchmarkTable(ISSA):
-    def __init__(self, table_name: str = "Product_Benchmark"):
-        super().__init__()
+    def __init__(self, table_name: str = "Product_Benchmark", db_file: str = DB_FILE):
+        super().__init__(db_file)
         self.table_name = table_name
         self.pk_value = ""
         self.create_table_sql = f"""
@@ -462,7 +1167,46 @@ class ProductBenchmarkTable(ISSA):
         super().create(self.create_table_sql)
 
 
+    @timed
     def get_product_benchmark(self, serial_number):
+        try:
+            with self.manager.reader() as conn:
+                c = conn.cursor()
+                c.execute(self._benchmark_query(), (serial_number,))
+                return c.fetchall()
+        except Error as err:
+            print(err)
+
+
+    def iter_product_benchmark(self, serial_number: str, chunk_size: int = 1000):
+        """
+        Streams the benchmark of a product in chunks.
+
+        Parameters
+            serial_number   (str): Serial Number.
+            chunk_size      (int): Rows per chunk.
+
+        Yields
+            rows (list): Next chunk of benchmark rows.
+        """
+        return self.stream(self._benchmark_query(), (serial_number,), chunk_size)
+
+
+    def iter_benchmarks_between(self, start: str = None, end: str = None, chunk_size: int = 1000):
+        """
+        Streams the benchmarks of every product created in a time window.
+
+        Served by a range scan of idx_product_benchmark_created_on.
+
+        Parameters
+            start       (str): First created_on, 'YYYY-MM-DD HH:MM:SS' UTC.
+            end         (str): End of the window, excluded.
+            chunk_size  (int): Rows per chunk.
+
+        Yields
+            rows (list): Next chunk of benchmark rows, in creation order.
+        """
+        where, params = time_window("pb.created_on", start, end)
         query = f"""
         SELECT
             pb.serial_number as 'Serial Number',
@@ -470,54 +1214,194 @@ class ProductBenchmarkTable(ISSA):
             round(pb.duration_sec) as 'Duration in sec',
             pb.created_on as 'Date'
         FROM
-            Product_Benchmark pb
+            {self.table_name} pb
         INNER JOIN
             Benchmark b ON b.id = pb.benchmark_id
         WHERE
-            pb.serial_number = '{serial_number}';
+            {where}
+        ORDER BY
+            pb.created_on, pb.id;
         """
-        try:
-            with self.create_connection() as conn:
-                c = conn.cursor()
-                c.execute(query)
-                return c.fetchall()
-        except Error as err:
-            print(err)
+        return self.stream(query, tuple(params), chunk_size)
+
+
+    def _benchmark_query(self) -> str:
+        return f"""
+        SELECT
+            pb.serial_number as 'Serial Number',
+            b.name as 'Test Step',
+            round(pb.duration_sec) as 'Duration in sec',
+            pb.created_on as 'Date'
+        FROM
+            {self.table_name} pb
+        INNER JOIN
+            Benchmark b ON b.id = pb.benchmark_id
+        WHERE
+            pb.serial_number = ?
+        ORDER BY
+            pb.id;
+        """
+
+
+    @timed
+    def get_benchmark_stats(self, product_type: str = None, percentiles: tuple = (0.5, 0.95, 0.99)) -> list:
+        """
+        Aggregates the step durations per product type inside SQLite.
+
+        Percentiles use the nearest-rank method over the sorted durations of every
+        (type, step) partition, so only one row per step leaves the DB.
+
+        Parameters
+            product_type    (str): Product type, every type if None.
+            percentiles     (tuple): Percentiles to compute, between 0 and 1.
+
+        Returns
+            rows (list): (type, step, count, mean, min, max, *percentiles) per step.
+        """
+        percentile_cols = ",\n".join(
+            f"MIN(CASE WHEN rn >= {float(p)} * n THEN duration END) AS 'p{round(p * 100)}'"
+            for p in percentiles)
+        where = "WHERE p.type = ?" if product_type else ""
+        query = f"""
+        WITH ranked AS (
+            SELECT
+                p.type AS type,
+                pb.benchmark_id AS benchmark_id,
+                pb.duration_sec AS duration,
+                ROW_NUMBER() OVER w AS rn,
+                COUNT(*) OVER (PARTITION BY p.type, pb.benchmark_id) AS n
+            FROM
+                {self.table_name} pb
+            INNER JOIN
+                Product p ON p.serial_number = pb.serial_number
+            {where}
+            WINDOW w AS (PARTITION BY p.type, pb.benchmark_id ORDER BY pb.duration_sec)
+        )
+        SELECT
+            r.type AS 'Product Type',
+            b.name AS 'Test Step',
+            MAX(r.n) AS 'Count',
+            AVG(r.duration) AS 'Mean',
+            MIN(r.duration) AS 'Min',
+            MAX(r.duration) AS 'Max',
+            {percentile_cols}
+        FROM
+            ranked r
+        INNER JOIN
+            Benchmark b ON b.id = r.benchmark_id
+        GROUP BY
+            r.type, r.benchmark_id
+        ORDER BY
+            r.type, b.name;
+        """
+        return self.fetch(query, (product_type,) if product_type else ())
+
+
+    def insert_product_benchmark(self, serial_number: str, benchmark_name: str, duration_sec: int) -> InsertResult:
+        """
+        Inserts the duration of one benchmark step into a product.
+
+        Parameters
+            serial_number   (str): Serial Number.
+            benchmark_name  (str): Benchmark step name.
+            duration_sec    (int): Step duration in seconds.
+
+        Returns
+            result (InsertResult): Number of inserted and rejected rows.
+        """
+        return self.insert_product_benchmarks(serial_number, [(benchmark_name, duration_sec)])
+
 
+    @timed
+    def insert_product_benchmarks(self, serial_number: str, steps: list) -> InsertResult:
+        """
+        Inserts the durations of a whole test sequence into a product.
+
+        Step names are resolved against the Benchmark cache, unknown names are created
+        in bulk, and all the durations are written in one transaction.
 
-    def insert_product_benchmark(self, serial_number: str, benchmark_name: str, duration_sec: int):
-        b = BenchmarkTable()
-        benchmark_id = b.get_id(benchmark_name)
-        if not benchmark_id:
-            table_data = {
-                "table_name": "Benchmark",
-                "table_values": [{"name": benchmark_name}]
-            }
-            b.insert(table_data)
-            benchmark_id = b.get_id(benchmark_name)
+        Parameters
+            serial_number   (str): Serial Number.
+            steps           (list): (benchmark_name, duration_sec) tuples.
+
+        Returns
+            result (InsertResult): Number of inserted and rejected rows.
+        """
+        benchmark_table = BenchmarkTable(db_file=self.db_file)
         try:
-            with self.create_connection() as conn:
-                c = conn.cursor()
-                table_data = {
-                    "table_name": self.table_name, 
-                    "table_values": [{  "serial_number": serial_number, 
-                                        "benchmark_id": benchmark_id, 
-                                        "duration_sec": duration_sec}]}
-                self.insert(table_data)
+            with self.session():
+                benchmark_ids = benchmark_table.resolve_ids([name for name, _ in steps])
+                rows = [(serial_number, benchmark_ids[name], duration_sec) for name, duration_sec in steps]
+                return self.insert_many(self.table_name, rows, ["serial_number", "benchmark_id", "duration_sec"])
         except Error as err:
             print(err)
+            return InsertResult(0, len(steps))
 
 
     def get_product_benchmarks(self, serial_numbers: list) -> list:
-        return [self.get_product_benchmark(serial_number) for serial_number in serial_numbers]
+        """
+        Gets the benchmarks of many products with one query per chunk of serials.
+
+        Parameters
+            serial_numbers (list): Serial numbers.
+
+        Returns
+            rows (list): One list of rows per serial number, in the same order.
+        """
+        benchmarks = dict(self.iter_product_benchmarks(serial_numbers=serial_numbers))
+        return [benchmarks.get(serial_number, []) for serial_number in serial_numbers]
+
+
+    @timed
+    def iter_product_benchmarks(self,
+                                serial_numbers: list = None,
+                                serial_range: tuple = None,
+                                product_type: str = None):
+        """
+        Streams the benchmarks of many products grouped by serial number.
+
+        Rows are read straight from the cursor, sorted by serial number, so only one
+        product is held in memory at a time.
+
+        Parameters
+            serial_numbers  (list): Serial numbers.
+            serial_range    (tuple): (first, last) serial numbers, both included.
+            product_type    (str): Product.type of the products.
+
+        Yields
+            (serial_number, rows) (tuple): Serial number and its benchmark rows.
+        """
+        for where, params in serial_conditions("pb.serial_number", serial_numbers, serial_range, product_type):
+            query = f"""
+            SELECT
+                pb.serial_number as 'Serial Number',
+                b.name as 'Test Step',
+                round(pb.duration_sec) as 'Duration in sec',
+                pb.created_on as 'Date'
+            FROM
+                {self.table_name} pb
+            INNER JOIN
+                Benchmark b ON b.id = pb.benchmark_id
+            WHERE
+                {where}
+            ORDER BY
+                pb.serial_number, pb.id;
+            """
+            with self.manager.reader() as conn:
+                cur = conn.execute(query, params)
+                for serial_number, rows in groupby(cur, key=itemgetter(0)):
+                    yield serial_number, list(rows)
 
 
 class TestTable(ISSA):
     """
     Class to represent a Test Table in ISSA.
+
+    Every test has a category (did, general, ...) computed from its name when it is
+    inserted, see TEST_CATEGORIES, so category lookups use idx_test_category.
     """
-    def __init__(self, table_name: str = "Test") -> None:
-        super().__init__()
+    def __init__(self, table_name: str = "Test", db_file: str = DB_FILE) -> None:
+        super().__init__(db_file)
         self.table_name = table_name
 
 
@@ -538,6 +1422,7 @@ class TestTable(ISSA):
         super().create(sql)
 
 
+    @timed
     def is_valid(self, name: str) -> bool:
         """
         Verify if table attribute is valid.
@@ -554,7 +1439,7 @@ class TestTable(ISSA):
         WHERE name is '{name}';
         """
         try:
-            with self.create_connection() as conn:
+            with self.manager.reader() as conn:
                 cur = conn.cursor()
                 cur.execute(query)
                 id = cur.fetchone()
@@ -576,19 +1461,29 @@ class TestTable(ISSA):
         Return
             id      (int): Test id of the requested name.
         """
-        query = f"""
-            SELECT (id) FROM {self.table_name} WHERE name = '{name}';
+        return self._cached_id(name)
+
+
+    @timed
+    def resolve_ids(self, tests: list) -> dict:
         """
-        rows = self.fetch(query)
-        try:
-            return rows[0][0]
-        except IndexError:
-            return None
+        Gets the ids of the test definitions, creating the missing ones.
+
+        Parameters
+            tests (list): Sequences starting with (name, type, min_limit, max_limit, units).
+
+        Returns
+            ids (dict): Test name -> test id.
+        """
+        rows = {}
+        for test in tests:
+            rows.setdefault(test[0], tuple(test[:5]) + (classify_test(test[0]),))
+        return self._resolve_names(rows, ("name", "type", "min_limit", "max_limit", "units", "category"))
 
 
 class ProductTestTable(ISSA):
-    def __init__(self, table_name: str = "Product_Test") -> None:
-        super().__init__()
+    def __init__(self, table_name: str = "Product_Test", db_file: str = DB_FILE) -> None:
+        super().__init__(db_file)
         self.table_name = table_name
 
 
@@ -610,33 +1505,63 @@ class ProductTestTable(ISSA):
         super().create(sql)
 
 
-    def insert_product_test(self, serial_number: str, tests: list) -> None:
+    @timed
+    def insert_product_test(self, serial_number: str, tests: list) -> InsertResult:
         """
-        $Insert a test into a product.
+        Inserts the results of a test sequence into a product.
+
+        Missing test definitions are created first, then all the results are written
+        with one executemany, everything in a single transaction.
 
         Parameters
-            $serial_number ($str): $Serial Number.
+            serial_number   (str): Serial Number.
+            tests           (list): Sequences (name, type, min_limit, max_limit, units, result).
 
         Returns
-            None
+            result (InsertResult): Number of inserted and rejected results.
         """
-        # Log data only for testing purposes
-        # with open("../issa/log.txt", 'w') as f:
-        #     f.write(serial_number + '\n')
-        #     for item in tests:
-        #         f.write(str(item) + '\n')
+        test_table = TestTable(db_file=self.db_file)
+        try:
+            with self.session():
+                test_ids = test_table.resolve_ids(tests)
+                rows = [(serial_number, test_ids[test[0]], test[-1]) for test in tests]
+                return self.insert_many(self.table_name, rows, ["serial_number", "test_id", "result"])
+        except Error as err:
+            print(err)
+            return InsertResult(0, len(tests))
 
-        pt = ProductTestTable()
-        test_table = TestTable()
-        for test in tests:
-            if not test_table.is_valid(test[0]):
-                test_table.insert_values(
-                    columns=["name", "type", "min_limit", "max_limit", "units"],
-                    table_data=[test[:5]]
-                )
-            test_id = test_table.get_id(test[0])
-            print(test_id)
-            pt.insert_values(
-                columns=["serial_number", "test_id", "result"],
-                table_data=[(serial_number, test_id, test[-1])]
-            )
\ No newline at end of file
+
+    def iter_results_between(self, start: str = None, end: str = None, chunk_size: int = 1000):
+        """
+        Streams the test results of every product created in a time window.
+
+        Served by a range scan of idx_product_test_created_on.
+
+        Parameters
+            start       (str): First created_on, 'YYYY-MM-DD HH:MM:SS' UTC.
+            end         (str): End of the window, excluded.
+            chunk_size  (int): Rows per chunk.
+
+        Yields
+            rows (list): Next chunk of result rows, in creation order.
+        """
+        where, params = time_window("pt.created_on", start, end)
+        query = f"""
+        SELECT
+            pt.serial_number as 'Serial Number',
+            t.name as 'Test Name',
+            pt.result as 'Result',
+            t.min_limit as 'Min Limit',
+            t.max_limit as 'Max Limit',
+            t.units as 'Units',
+            pt.created_on as 'Date'
+        FROM
+            {self.table_name} pt
+        INNER JOIN
+            Test t ON t.id = pt.test_id
+        WHERE
+            {where}
+        ORDER BY
+            pt.created_on, pt.id;
+        """
+        return self.stream(query, tuple(params), chunk_size)
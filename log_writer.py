@@ -0,0 +1,115 @@
+"""Group commit writer of the Log table."""
+
+import atexit
+import queue
+import threading
+import time
+import weakref
+
+from batching import drain
+
+LOG_COLUMNS = ["type", "desc", "serial_number", "created_on", "updated_on"]
+
+
+class LogWriter:
+    """
+    A class to represent a queued writer of log lines.
+
+    Callers only put records into an in-process queue, a dedicated thread inserts
+    them with one transaction, so one commit, per batch. A batch is committed when
+    batch_size records are waiting or when the oldest one waited max_latency seconds.
+    created_on is the time the record was queued, not the commit time.
+
+    Attributes:
+        table       (LogTable): Table the logs are written to.
+        batch_size  (int): Max number of records committed at once.
+        max_latency (float): Max seconds a record waits before being committed.
+        written     (int): Records committed.
+        rejected    (int): Records the DB refused or that failed to be written.
+
+    Methods:
+        log(log_type, desc, serial_number):
+            Queues a log line.
+        flush():
+            Blocks until every queued record is committed, e.g. at the end of a test.
+        close():
+            Commits the pending records and stops the writer thread.
+    """
+    def __init__(self, table, batch_size: int = 500, max_latency: float = 0.2, queue_size: int = 100000) -> None:
+        self.table = table
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.written = 0
+        self.rejected = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="issa-log-writer", daemon=True)
+        self._thread.start()
+        _writers.add(self)
+
+
+    def __enter__(self) -> "LogWriter":
+        return self
+
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+    def log(self, log_type: str, desc: str, serial_number: str) -> None:
+        """
+        Queues a log line, only waits if queue_size records are already waiting.
+
+        Parameters
+            log_type        (str): Log type, e.g. INFO.
+            desc            (str): Log text.
+            serial_number   (str): Serial number of the tested product.
+
+        Returns
+            None
+        """
+        if self._closed:
+            raise ValueError("LogWriter is closed")
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        self._queue.put((log_type, desc, serial_number, stamp, stamp))
+
+
+    def flush(self) -> None:
+        """Blocks until every queued record is committed."""
+        self._queue.join()
+
+
+    def close(self) -> None:
+        """Commits the pending records and stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        _writers.discard(self)
+
+
+    def _run(self) -> None:
+        """Writer thread, drains the queue in batches."""
+        drain(self._queue, self.batch_size, self.max_latency, self._write, self._failed)
+
+
+    def _write(self, records: list) -> None:
+        result = self.table.insert_many(self.table.table_name, records, LOG_COLUMNS)
+        self.written += result.inserted
+        self.rejected += result.rejected
+
+
+    def _failed(self, records: list, err: Exception) -> None:
+        """Counts a batch that could not be inserted, the writer keeps running."""
+        print(err)
+        self.rejected += len(records)
+
+
+_writers = weakref.WeakSet()
+
+
+@atexit.register
+def _shutdown() -> None:
+    for writer in list(_writers):
+        writer.close()
@@ -1,6 +1,7 @@
 from random import randint
 # from data.temp import logs
 from issa import *
+from migrations import migrate
 from rf_bands import LTE, WCMDA, GSM
 
 
@@ -23,14 +24,11 @@ def init_database():
     pt.drop()
     test_table.drop()
 
-    product_table.create()
-    log_table.create()
-    rf_table.create()
-    prf_table.create()
-    benchmark_table.create()
-    pb_table.create()
-    test_table.create()
-    pt.create()
+    migrate(reset=True)
+
+
+def upgrade_database():
+    migrate()
 
 
 def insert_fake_data(table_name: str, table_values: list):
@@ -0,0 +1,188 @@
+"""Versioned schema migrations for the ISSA DB."""
+
+import argparse
+from collections import namedtuple
+from sqlite3 import Connection, OperationalError
+
+from connection import get_manager
+from issa import (DB_FILE, test_category_sql, ProductTable, LogTable, BandTable, ProductBandTable,
+                  BenchmarkTable, ProductBenchmarkTable, TestTable, ProductTestTable)
+
+
+Migration = namedtuple("Migration", ["version", "description", "apply"])
+
+
+def _baseline(conn: Connection, db_file: str) -> None:
+    """Creates the tables defined by the ISSA table classes."""
+    for table in (ProductTable, LogTable, BandTable, ProductBandTable,
+                  BenchmarkTable, ProductBenchmarkTable, TestTable, ProductTestTable):
+        table(db_file=db_file).create()
+
+
+def _query_indexes(conn: Connection, db_file: str) -> None:
+    """Indexes for serial number lookups, band validation and time range queries."""
+    statements = [
+        "CREATE INDEX IF NOT EXISTS idx_product_type ON Product(type);",
+        "CREATE INDEX IF NOT EXISTS idx_product_created_on ON Product(created_on);",
+        "CREATE INDEX IF NOT EXISTS idx_log_serial_number ON Log(serial_number);",
+        "CREATE INDEX IF NOT EXISTS idx_log_created_on ON Log(created_on);",
+        "CREATE INDEX IF NOT EXISTS idx_product_benchmark_serial_number ON Product_Benchmark(serial_number);",
+        "CREATE INDEX IF NOT EXISTS idx_product_benchmark_created_on ON Product_Benchmark(created_on);",
+        "CREATE INDEX IF NOT EXISTS idx_product_test_serial_number ON Product_Test(serial_number);",
+        "CREATE INDEX IF NOT EXISTS idx_product_test_created_on ON Product_Test(created_on);",
+        "CREATE INDEX IF NOT EXISTS idx_product_band_serial_number ON Product_Band(serial_number);",
+        "CREATE INDEX IF NOT EXISTS idx_product_band_created_on ON Product_Band(created_on);",
+        "CREATE INDEX IF NOT EXISTS idx_band_tech_band_frequency ON Band(tech, band, frequency);",
+    ]
+    for statement in statements:
+        conn.execute(statement)
+
+
+def _add_columns(conn: Connection, table_name: str, columns: dict) -> None:
+    """Adds the columns missing from a table."""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table_name});")}
+    for column, definition in columns.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {definition};")
+
+
+def _rf_verdict(conn: Connection, db_file: str) -> None:
+    """Band, target and pass/fail of every RF measurement."""
+    _add_columns(conn, "Product_Band", {
+        "tech": "TEXT",
+        "band": "INTEGER",
+        "target": "REAL",
+        "delta": "REAL",
+        "passed": "INTEGER",
+    })
+
+
+def _log_archive_catalog(conn: Connection, db_file: str) -> None:
+    """Archived months of the Log table and the serial numbers they hold."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Log_Partition(
+            month TEXT PRIMARY KEY,
+            file TEXT NOT NULL,
+            rows INTEGER NOT NULL DEFAULT 0,
+            archived_on TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Log_Archive(
+            serial_number TEXT NOT NULL,
+            month TEXT NOT NULL,
+            PRIMARY KEY(serial_number, month)
+        ) WITHOUT ROWID;
+    """)
+
+
+def _log_search_index(conn: Connection, db_file: str) -> None:
+    """FTS5 index of Log.desc, kept in sync by triggers, and its backfill."""
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS Log_fts
+            USING fts5("desc", content='Log', content_rowid='id');
+        """)
+    except OperationalError as err:
+        # SQLite built without FTS5, LogTable.search() falls back to LIKE.
+        print(f"Log full-text search disabled: {err}")
+        return
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS Log_fts_insert AFTER INSERT ON Log BEGIN
+            INSERT INTO Log_fts(rowid, "desc") VALUES (new.id, new."desc");
+        END;
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS Log_fts_delete AFTER DELETE ON Log BEGIN
+            INSERT INTO Log_fts(Log_fts, rowid, "desc") VALUES ('delete', old.id, old."desc");
+        END;
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS Log_fts_update AFTER UPDATE OF "desc" ON Log BEGIN
+            INSERT INTO Log_fts(Log_fts, rowid, "desc") VALUES ('delete', old.id, old."desc");
+            INSERT INTO Log_fts(rowid, "desc") VALUES (new.id, new."desc");
+        END;
+    """)
+    conn.execute("INSERT INTO Log_fts(Log_fts) VALUES ('rebuild');")
+
+
+def _test_categories(conn: Connection, db_file: str) -> None:
+    """Indexed Test.category, backfilled and set by a trigger for rows inserted without it."""
+    _add_columns(conn, "Test", {"category": "TEXT"})
+    conn.execute(f"UPDATE Test SET category = {test_category_sql()} WHERE category IS NULL;")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_test_category ON Test(category);")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS Test_category AFTER INSERT ON Test
+        WHEN new.category IS NULL BEGIN
+            UPDATE Test SET category = {test_category_sql()} WHERE id = new.id;
+        END;
+    """)
+
+
+MIGRATIONS = [
+    Migration(1, "Baseline tables", _baseline),
+    Migration(2, "Serial number, band and created_on indexes", _query_indexes),
+    Migration(3, "Product_Band tech, band, target, delta and passed columns", _rf_verdict),
+    Migration(4, "Log archive catalog", _log_archive_catalog),
+    Migration(5, "Log full-text search index", _log_search_index),
+    Migration(6, "Indexed test categories", _test_categories),
+]
+
+
+def get_version(db_file: str = DB_FILE) -> int:
+    """
+    Gets the schema version stored in the DB.
+
+    Parameters
+        db_file (str): Path to the SQLite DB.
+
+    Returns
+        version (int): Last applied migration, 0 for an unversioned DB.
+    """
+    with get_manager(db_file).reader() as conn:
+        return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(db_file: str = DB_FILE, target: int = None, reset: bool = False) -> int:
+    """
+    Applies the pending migrations in place, without dropping any data.
+
+    Every migration runs in its own transaction together with the version bump, so
+    an interrupted upgrade can be resumed by running it again. The baseline commits
+    table by table, it only creates the missing ones.
+
+    Parameters
+        db_file (str): Path to the SQLite DB.
+        target  (int): Stop at this version, latest if None.
+        reset   (bool): Re-apply every migration, e.g. after the tables were dropped.
+
+    Returns
+        version (int): Schema version after the upgrade.
+    """
+    manager = get_manager(db_file)
+    target = MIGRATIONS[-1].version if target is None else target
+    version = 0 if reset else get_version(db_file)
+    for migration in MIGRATIONS:
+        if version < migration.version <= target:
+            with manager.transaction() as conn:
+                migration.apply(conn, db_file)
+                conn.execute(f"PRAGMA user_version = {migration.version};")
+            version = migration.version
+            print(f"Schema version {version}: {migration.description}")
+    with manager.transaction() as conn:
+        conn.execute("PRAGMA optimize;")
+    return version
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="Upgrade the ISSA DB schema in place.")
+    parser.add_argument("--db", default=DB_FILE, help="Path to the SQLite DB.")
+    parser.add_argument("--target", type=int, default=None, help="Schema version to stop at.")
+    parser.add_argument("--rebuild-fts", action="store_true",
+                        help="Create the Log full-text index if needed and rebuild it from Log.")
+    args = parser.parse_args()
+    print(f"Schema version {migrate(args.db, args.target)}")
+    if args.rebuild_fts:
+        with get_manager(args.db).transaction() as conn:
+            _log_search_index(conn, args.db)
+        print("Log full-text index rebuilt")
@@ -1,9 +1,33 @@
-"""Report Generation"""
+"""Report Generation
+
+pandas and openpyxl are imported by the methods writing a workbook, so importing
+this module, e.g. from the UI, stays cheap.
+"""
 
 import os
-import pandas as pd
+from datetime import date
+
+from excel import write_sheets
+from export import write_csv, write_parquet
+from issa import DB_FILE, ProductTable, ProductBenchmarkTable, ProductBandTable, ProductTestTable, LogTable
+
 
-from issa import ProductTable, ProductBenchmarkTable, LogTable
+BENCHMARK_COLUMNS = ['Serial Number', 'Test Step', 'Duration in sec', 'Date']
+LOG_COLUMNS = ['Serial Number', 'Type', 'Description', 'Creation Date']
+DIDS_COLUMNS = ['Test Name', 'Min Limit', 'Max Limit', 'Units']
+TEST_RESULT_COLUMNS = ['Serial Number', 'Test Name', 'Result', 'Min Limit', 'Max Limit', 'Units', 'Date']
+RF_COLUMNS = ['Serial Number', 'Tech', 'Band', 'Frequency', 'Power', 'Units', 'Target', 'Delta', 'Passed', 'Date']
+BENCHMARK_STATS_COLUMNS = ['Product Type', 'Test Step', 'Count', 'Mean', 'Min', 'Max', 'p50', 'p95', 'p99']
+
+
+# Dataset -> (columns, Parquet types) of Report.export().
+EXPORTS = {
+    "benchmark": (BENCHMARK_COLUMNS, ["string", "string", "float64", "timestamp"]),
+    "log": (LOG_COLUMNS, ["string", "string", "string", "timestamp"]),
+    "dids": (['Serial Number'] + DIDS_COLUMNS, ["string"] * 5),
+    "rf": (RF_COLUMNS, ["string", "string", "int64", "float64", "float64", "string",
+                        "float64", "float64", "bool", "timestamp"]),
+}
 
 
 class Report:
@@ -15,16 +39,31 @@ class Report:
         log_test_path       (str): Log report path
         benchmark_path      (str): Benchmark report path
         dids_report_path    (str): DIDs report path
+        streaming           (bool): Stream rows from the cursor to a write-only workbook,
+                                    memory stays bounded whatever the number of rows.
+        chunk_size          (int): Rows fetched at once in streaming mode.
+        progress            (callable): Called as progress(rows) after every chunk in
+                                    streaming mode, may raise to cancel the report.
+        db_file             (str): Path to the SQLite DB.
 
     Methods:
         create_base_path():
             Set base path for all report files.    
+        dated_path(serial_number, report_name):
+            Builds the SerialNumber_ReportName_YYMMDD.xlsx path of a report.
+        export(dataset, path, ...):
+            Writes a dataset to Parquet or CSV, straight from the cursor.
     """
-    def __init__(self) -> None:
+    def __init__(self, streaming: bool = False, chunk_size: int = 5000, progress=None,
+                 db_file: str = DB_FILE) -> None:
         self.base_path          = self.create_base_path()
         self.log_test_path      = self.base_path + "/LogTest.xlsx"
         self.benchmark_path     = self.base_path + "/Benchmark.xlsx"
         self.dids_report_path   = self.base_path + "/DIDs_Report.xlsx"
+        self.streaming          = streaming
+        self.chunk_size         = chunk_size
+        self.progress           = progress
+        self.db_file            = db_file
 
 
     def create_base_path(self) -> str:
@@ -32,31 +71,49 @@ class Report:
         Set base path for all report files.
         """
         base_path = "reports"
-        if not os.path.exists(base_path):
-            os.mkdir(base_path)
+        os.makedirs(base_path, exist_ok=True)
         return base_path
 
 
-    def write_product_benchmark(self, serial_number: str) -> None:
+    def dated_path(self, serial_number: str, report_name: str, day: date = None) -> str:
+        """
+        Builds the SerialNumber_ReportName_YYMMDD.xlsx path of a report.
+
+        Parameters
+            serial_number   (str): Serial number
+            report_name     (str): Report name, e.g. Benchmark
+            day             (date): Report date, today if None
+
+        Returns
+            path (str): Report path in base_path
+        """
+        day = day or date.today()
+        return f"{self.base_path}/{serial_number}_{report_name}_{day:%y%m%d}.xlsx"
+
+
+    def write_product_benchmark(self, serial_number: str, path: str = None) -> None:
         """
         Generates a benchmark report realeted to an specific product.
 
         Parameters
             serial_number (str): Serial number
+            path          (str): Report path, benchmark_path if None
 
         Returns
             None
         """
-        #TODO (redone13): Add serial number to the begining of the file name
-        #     and current date yymmdd
-        #     SerialNumber_ReportName_YYMMDD.xlsx
-        product = ProductTable()
+        path = path or self.benchmark_path
+        product = ProductTable(db_file=self.db_file)
         if product.is_valid(serial_number):
-            pb = ProductBenchmarkTable()
+            pb = ProductBenchmarkTable(db_file=self.db_file)
+            if self.streaming:
+                chunks = pb.iter_product_benchmark(serial_number, self.chunk_size)
+                write_sheets(path, [(serial_number, BENCHMARK_COLUMNS, chunks)], self.progress)
+                return
+            import pandas as pd
             data = pb.get_product_benchmark(serial_number)
-            cols = ['Serial Number', 'Test Step', 'Duration in sec', 'Date']
-            with pd.ExcelWriter(self.benchmark_path) as writer:
-                df = pd.DataFrame(data, columns=cols)
+            with pd.ExcelWriter(path) as writer:
+                df = pd.DataFrame(data, columns=BENCHMARK_COLUMNS)
                 df.to_excel(writer, sheet_name=serial_number, index=False)
         else:
             print("product not found!")
@@ -64,57 +121,177 @@ class Report:
 
     def write_last_product_benchmark(self) -> None:
         """Writes a report from the last serial number in the db."""
-        product = ProductTable()
+        product = ProductTable(db_file=self.db_file)
         last_row = product.get_last_row()
         last_sn = last_row[0]
         self.write_product_benchmark(last_sn)
 
 
-    def write_log_test(self, serial_number: str) -> None:
+    def write_log_test(self, serial_number: str, path: str = None) -> None:
         """
         Writes a report log from the provided serial number.
 
         Parameters
             serial_number (str): Serial Number
+            path          (str): Report path, log_test_path if None
 
         Returns
             None
         """
-        log = LogTable()
+        path = path or self.log_test_path
+        log = LogTable(db_file=self.db_file)
+        if self.streaming:
+            chunks = log.iter_logs_by_serial_number(serial_number, self.chunk_size)
+            write_sheets(path, [(serial_number, LOG_COLUMNS, chunks)], self.progress)
+            return
+        import pandas as pd
         logs = log.get_logs_by_serial_number(serial_number)
-        with pd.ExcelWriter(self.log_test_path) as writer:
-            df = pd.DataFrame(  logs,
-                                columns=['Serial Number', 'Type', 'Description', 'Creation Date'])
+        with pd.ExcelWriter(path) as writer:
+            df = pd.DataFrame(logs, columns=LOG_COLUMNS)
             df.to_excel(writer, sheet_name=serial_number, index=False)
 
 
     def write_log_test_last_product(self) -> None:
         """Writes a report log from the last serial number."""
-        product = ProductTable()
+        product = ProductTable(db_file=self.db_file)
         last_row = product.get_last_row()
         last_sn = last_row[0]
         self.write_log_test(last_sn)
 
 
-    #TODO (redone13): Implement a function for writing a benchmark report based on the product type.
+    def write_product_type_benchmark(self, product_type: str = None, path: str = None) -> None:
+        """
+        Writes the step duration statistics of a product type.
+
+        Count, mean, min, max and p50/p95/p99 of every test step are computed by SQLite,
+        only one row per step is loaded into pandas.
+
+        Parameters
+            product_type    (str): Product type, every type if None.
+            path            (str): Report path, base_path/<type>_Benchmark_Stats.xlsx if None.
+
+        Returns
+            None
+        """
+        name = product_type or "All"
+        path = path or f"{self.base_path}/{name}_Benchmark_Stats.xlsx"
+        import pandas as pd
+        stats = ProductBenchmarkTable(db_file=self.db_file).get_benchmark_stats(product_type)
+        with pd.ExcelWriter(path) as writer:
+            df = pd.DataFrame(stats or [], columns=BENCHMARK_STATS_COLUMNS)
+            df.to_excel(writer, sheet_name=name[:31], index=False)
+
+
+    def write_time_window(self, start: str, end: str, path: str = None) -> int:
+        """
+        Writes the benchmarks, logs and test results of every unit of a time window.
+
+        Each sheet is a created_on range scan streamed to the write-only workbook, so
+        memory stays bounded whatever the length of the window. See time_windows.py
+        for the shift and day windows.
+
+        Parameters
+            start   (str): First created_on, 'YYYY-MM-DD HH:MM:SS' UTC.
+            end     (str): End of the window, excluded.
+            path    (str): Report path, base_path/<start>_<end>_Window.xlsx if None.
+
+        Returns
+            rows (int): Number of data rows written.
+        """
+        stamp = "{}_{}".format(*(value.replace("-", "").replace(":", "").replace(" ", "T") for value in (start, end)))
+        path = path or f"{self.base_path}/{stamp}_Window.xlsx"
+        sheets = [
+            ("Benchmark", BENCHMARK_COLUMNS, ProductBenchmarkTable(db_file=self.db_file).iter_benchmarks_between(start, end, self.chunk_size)),
+            ("Log", LOG_COLUMNS, LogTable(db_file=self.db_file).iter_logs_between(start, end, self.chunk_size)),
+            ("Tests", TEST_RESULT_COLUMNS, ProductTestTable(db_file=self.db_file).iter_results_between(start, end, self.chunk_size)),
+        ]
+        return write_sheets(path, sheets, self.progress)
+
+
+    def export(self,
+               dataset: str,
+               path: str = None,
+               serial_numbers: list = None,
+               serial_range: tuple = None,
+               product_type: str = None,
+               start: str = None,
+               end: str = None,
+               compression: str = "zstd") -> int:
+        """
+        Writes a dataset to Parquet or CSV, straight from the cursor.
+
+        Rows are selected by serial numbers, or by created_on window when start or
+        end is given (DIDs are always selected by serial number). The format follows
+        the extension of path: .parquet, .csv or .csv.gz. There is no row limit.
+
+        Parameters
+            dataset         (str): benchmark, log, dids or rf, see EXPORTS.
+            path            (str): Export path, base_path/<dataset>_YYMMDD.parquet if None.
+            serial_numbers  (list): Serial numbers.
+            serial_range    (tuple): (first, last) serial numbers, both included.
+            product_type    (str): Product type.
+            start           (str): First created_on, 'YYYY-MM-DD HH:MM:SS' UTC.
+            end             (str): End of the window, excluded.
+            compression     (str): Parquet compression codec.
+
+        Returns
+            rows (int): Number of data rows written.
+        """
+        if dataset not in EXPORTS:
+            raise ValueError(f"Unknown dataset: {dataset}")
+        columns, types = EXPORTS[dataset]
+        path = path or f"{self.base_path}/{dataset}_{date.today():%y%m%d}.parquet"
+        chunks = self._export_chunks(dataset, serial_numbers, serial_range, product_type, start, end)
+        if path.endswith(".parquet"):
+            return write_parquet(path, columns, chunks, types, compression, progress=self.progress)
+        if path.endswith((".csv", ".csv.gz")):
+            return write_csv(path, columns, chunks, self.progress)
+        raise ValueError(f"Unknown export format: {path}")
+
+
+    def _export_chunks(self, dataset, serial_numbers, serial_range, product_type, start, end):
+        """Row chunks of an export dataset."""
+        by_window = start is not None or end is not None
+        if dataset == "rf":
+            return ProductBandTable(db_file=self.db_file).iter_product_bands(
+                serial_numbers, serial_range, product_type, start, end, self.chunk_size)
+        if dataset == "dids":
+            groups = ProductTable(db_file=self.db_file).iter_product_dids(serial_numbers, serial_range, product_type)
+            return ([(serial,) + row for row in rows] for serial, rows in groups)
+        if dataset == "benchmark":
+            if by_window:
+                return ProductBenchmarkTable(db_file=self.db_file).iter_benchmarks_between(start, end, self.chunk_size)
+            groups = ProductBenchmarkTable(db_file=self.db_file).iter_product_benchmarks(serial_numbers, serial_range, product_type)
+            return (rows for _, rows in groups)
+        log = LogTable(db_file=self.db_file)
+        if by_window:
+            return log.iter_logs_between(start, end, self.chunk_size)
+        return log.iter_logs(serial_numbers, serial_range, product_type, self.chunk_size)
+
 
     #TODO (redone13): Implement a function for writing a test log report based on the product type.
 
     #TODO (redone13): Add beautification to generated Excel Reports.
 
     #TODO (redone13): Create a DID Report.
-    def write_dids_report(self, serial_number) -> None:
+    def write_dids_report(self, serial_number, path: str = None) -> None:
         """
         Writes a DID reports for variants liberation.
 
         Parameters
             serial_number   (str):  Serial Number
+            path            (str):  Report path, dids_report_path if None
 
         Returns
             None
         """
-        product = ProductTable()
+        product = ProductTable(db_file=self.db_file)
+        path = path or self.dids_report_path
         test_dids = product.get_product_dids(serial_number)
-        with pd.ExcelWriter(self.dids_report_path) as writer:
-            df = pd.DataFrame(test_dids, columns=['Test Name', 'Min Limit', 'Max Limit', 'Units'])
+        if self.streaming:
+            write_sheets(path, [(serial_number, DIDS_COLUMNS, [test_dids or []])], self.progress)
+            return
+        import pandas as pd
+        with pd.ExcelWriter(path) as writer:
+            df = pd.DataFrame(test_dids, columns=DIDS_COLUMNS)
             df.to_excel(writer, sheet_name=serial_number, index=False)
@@ -0,0 +1,414 @@
+"""Slow statement capture of the ISSA layer, with their EXPLAIN QUERY PLAN.
+
+While enabled, every connection is opened with a profiling cursor that times each
+statement from execute to the last fetched row. A statement slower than the threshold
+is recorded with its bind parameters, the calling method and its query plan, and full
+scans of the large tables are flagged. The report aggregates the records by statement.
+
+    python slow_queries.py --db pme.db --threshold-ms 5 --output slow_queries.json
+
+The DB is copied first: the bench.py workload, including its inserts, runs on the copy.
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import connection
+
+# Tables a full scan is flagged on.
+WATCHED_TABLES = ("Log", "Product_Benchmark", "Product_Test")
+# Sample parameters kept per statement.
+SAMPLES = 5
+
+# Modules skipped when looking for the calling method.
+_INTERNAL = ("slow_queries.py", "connection.py", "instrumentation.py", "contextlib.py")
+# Generic ISSA helpers, attributed to the method calling them.
+_HELPERS = ("fetch", "stream", "insert", "insert_values", "insert_many", "_cached_id", "_resolve_names")
+_TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_NOT_ALIAS = {"WHERE", "JOIN", "INNER", "LEFT", "CROSS", "ON", "USING", "GROUP", "ORDER", "LIMIT",
+              "VALUES", "SELECT", "SET", "DEFAULT", "UNION", "EXCEPT", "INTERSECT", "AND", "OR"}
+
+_profiler = None
+
+
+class SlowQueryProfiler:
+    """
+    A class to represent the slow statements collected while profiling.
+
+    Attributes:
+        threshold   (float): Seconds above which a statement is recorded.
+        watched     (tuple): Tables a full scan is flagged on.
+        statements  (dict): Normalized SQL -> aggregated record.
+
+    Methods:
+        record(conn, sql, params, seconds, caller, executions):
+            Adds one slow statement.
+        report():
+            Aggregated records, slowest total first.
+        format_report():
+            Report as text.
+    """
+    def __init__(self, threshold_ms: float = 50.0, watched: tuple = WATCHED_TABLES) -> None:
+        self.threshold = threshold_ms / 1000
+        self.watched = watched
+        self.statements = {}
+        self._plans = {}
+        self._lock = threading.Lock()
+
+
+    def record(self, conn: sqlite3.Connection, sql: str, params, seconds: float,
+               caller: str, executions: int = 1) -> None:
+        """
+        Adds one slow statement.
+
+        Parameters
+            conn        (sqlite3.Connection): Connection the statement ran on.
+            sql         (str): Statement.
+            params      (tuple|dict): Bind parameters, the first set of an executemany.
+            seconds     (float): Time from execute to the last fetched row.
+            caller      (str): Calling method, e.g. LogTable.get_logs_by_serial_number.
+            executions  (int): Parameter sets of an executemany, 1 otherwise.
+
+        Returns
+            None
+        """
+        key = " ".join(sql.split())
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = self._plans[key] = self._explain(conn, sql, params)
+        with self._lock:
+            item = self.statements.get(key)
+            if item is None:
+                item = self.statements[key] = {
+                    "sql": key,
+                    "count": 0,
+                    "executions": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "callers": {},
+                    "params": [],
+                    "plan": plan,
+                    "full_scans": self._full_scans(key, plan),
+                }
+            item["count"] += 1
+            item["executions"] += executions
+            item["total_ms"] += seconds * 1000
+            if seconds * 1000 > item["max_ms"]:
+                item["max_ms"] = seconds * 1000
+                item["slowest_params"] = _format_params(params)
+            item["callers"][caller] = item["callers"].get(caller, 0) + 1
+            if len(item["params"]) < SAMPLES:
+                item["params"].append(_format_params(params))
+
+
+    def _explain(self, conn: sqlite3.Connection, sql: str, params) -> list:
+        """EXPLAIN QUERY PLAN detail lines, on a plain cursor so it is not profiled."""
+        try:
+            cursor = sqlite3.Cursor(conn)
+            try:
+                return [row[3] for row in cursor.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            finally:
+                cursor.close()
+        except (sqlite3.Error, ValueError) as err:
+            return [f"no plan: {err}"]
+
+
+    def _full_scans(self, sql: str, plan: list) -> list:
+        """Watched tables read by a SCAN step of the plan."""
+        aliases = {}
+        for table, alias in _TABLE_ALIAS.findall(sql):
+            aliases[table] = table
+            if alias and alias.upper() not in _NOT_ALIAS:
+                aliases[alias] = table
+        scans = []
+        for detail in plan:
+            match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+            if match:
+                table = aliases.get(match.group(1), match.group(1))
+                if table in self.watched and table not in scans:
+                    scans.append(table)
+        return scans
+
+
+    def report(self) -> list:
+        """
+        Gets the aggregated records.
+
+        Returns
+            statements (list): One dict per statement (sql, count, executions, total_ms,
+                               mean_ms, max_ms, callers, params, slowest_params, plan,
+                               full_scans), slowest total first.
+        """
+        with self._lock:
+            items = [dict(item, callers=dict(item["callers"]), params=list(item["params"]),
+                          mean_ms=item["total_ms"] / item["count"])
+                     for item in self.statements.values()]
+        return sorted(items, key=lambda item: item["total_ms"], reverse=True)
+
+
+    def format_report(self, limit: int = None) -> str:
+        """
+        Formats the report as text, full scans of the watched tables first.
+
+        Parameters
+            limit (int): Statements shown, all if None.
+
+        Returns
+            text (str): Report.
+        """
+        items = sorted(self.report(), key=lambda item: not item["full_scans"])[:limit]
+        lines = [f"{len(self.statements)} statements slower than {self.threshold * 1000:g} ms"]
+        for item in items:
+            lines.append("")
+            if item["full_scans"]:
+                lines.append(f"FULL SCAN {', '.join(item['full_scans'])}")
+            lines.append(f"{item['count']} slow runs, total {item['total_ms']:.1f} ms, "
+                         f"mean {item['mean_ms']:.2f} ms, max {item['max_ms']:.2f} ms")
+            lines.append(f"  sql:     {item['sql']}")
+            lines.append("  callers: " + ", ".join(f"{caller} ({count})" for caller, count
+                                                   in sorted(item["callers"].items(), key=lambda c: -c[1])))
+            lines.append(f"  params:  {item['slowest_params']}")
+            lines.extend(f"  plan:    {detail}" for detail in item["plan"])
+        return "\n".join(lines)
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """Cursor timing each statement from execute to its last fetched row."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        super().__init__(conn)
+        self._sql = None
+        self._params = None
+        self._executions = 0
+        self._caller = None
+        self._elapsed = 0.0
+
+
+    def _start(self, sql: str, params, executions: int) -> None:
+        self._finish()
+        self._sql = sql
+        self._params = params
+        self._executions = executions
+        self._caller = _caller()
+        self._elapsed = 0.0
+
+
+    def _finish(self) -> None:
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+        profiler = _profiler
+        if profiler is not None and self._elapsed >= profiler.threshold:
+            profiler.record(self.connection, sql, self._params, self._elapsed, self._caller, self._executions)
+
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed += time.perf_counter() - start
+
+
+    def execute(self, sql: str, params=()):
+        self._start(sql, params, 1)
+        return self._timed(super().execute, sql, params)
+
+
+    def executemany(self, sql: str, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        self._start(sql, seq_of_params[0] if seq_of_params else (), len(seq_of_params))
+        result = self._timed(super().executemany, sql, seq_of_params)
+        self._finish()
+        return result
+
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+
+    def fetchmany(self, size: int = None):
+        size = self.arraysize if size is None else size
+        rows = self._timed(super().fetchmany, size)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._finish()
+        return rows
+
+
+    def __next__(self):
+        try:
+            return self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+
+
+    def close(self) -> None:
+        self._finish()
+        super().close()
+
+
+    def __del__(self) -> None:
+        # Statements read with a single fetchone() end when the cursor is dropped.
+        self._finish()
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """Connection creating ProfilingCursor cursors, also for execute shortcuts."""
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
+
+    def execute(self, sql: str, params=()):
+        return self.cursor().execute(sql, params)
+
+
+    def executemany(self, sql: str, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+def _caller() -> str:
+    """
+    Calling method, the first frame outside the profiler and the connection layer.
+
+    A generic helper is named after its caller, e.g. ProductTable.get_product_dids > fetch.
+    """
+    frame = sys._getframe(2)
+    names = []
+    while frame is not None and len(names) < 2:
+        if os.path.basename(frame.f_code.co_filename) not in _INTERNAL:
+            owner = frame.f_locals.get("self")
+            if owner is not None:
+                names.append(f"{type(owner).__name__}.{frame.f_code.co_name}")
+            else:
+                module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+                names.append(f"{module}.{frame.f_code.co_name}")
+            if frame.f_code.co_name not in _HELPERS:
+                break
+        frame = frame.f_back
+    if not names:
+        return "?"
+    if len(names) == 2:
+        # Generators are named after the code reading them, the helper keeps its class.
+        owner, helper = names[0].rsplit(".", 1)
+        return f"{names[1]} > {helper if names[1].startswith(owner + '.') else names[0]}"
+    return names[0]
+
+
+def _format_params(params) -> str:
+    text = repr(params)
+    return text if len(text) <= 200 else text[:197] + "..."
+
+
+def enable(threshold_ms: float = 50.0, watched: tuple = WATCHED_TABLES) -> SlowQueryProfiler:
+    """
+    Turns the profiling on for the connections opened from now on.
+
+    Pooled readers are renewed, but a connection already owned by a thread is not
+    profiled until it is closed: enable before the workload starts.
+
+    Parameters
+        threshold_ms    (float): Statements slower than this are recorded.
+        watched         (tuple): Tables a full scan is flagged on.
+
+    Returns
+        profiler (SlowQueryProfiler): Collected records.
+    """
+    global _profiler
+    _profiler = SlowQueryProfiler(threshold_ms, watched)
+    connection.set_connection_factory(ProfilingConnection)
+    return _profiler
+
+
+def disable() -> SlowQueryProfiler:
+    """
+    Turns the profiling off, the next connections are opened without profiling.
+
+    Returns
+        profiler (SlowQueryProfiler): Records collected until now, None if not enabled.
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    connection.set_connection_factory(sqlite3.Connection)
+    return profiler
+
+
+def copy_db(db_file: str, target: str) -> None:
+    """
+    Copies a DB, consistent even while another process writes it.
+
+    Parameters
+        db_file (str): Source DB path.
+        target  (str): Copy path, overwritten.
+
+    Returns
+        None
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(target + suffix):
+            os.remove(target + suffix)
+    source = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    copy = sqlite3.connect(target)
+    try:
+        source.backup(copy)
+    finally:
+        copy.close()
+        source.close()
+
+
+if "__main__" == __name__:
+    from bench import Bench
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Capture the slow statements of the bench workload on a DB copy.")
+    parser.add_argument("--db", default="pme.db", help="DB to profile, it is copied and never written.")
+    parser.add_argument("--threshold-ms", type=float, default=5.0, help="Statements slower than this are recorded.")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs of every bench path.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed of the samples.")
+    parser.add_argument("--limit", type=int, default=20, help="Statements printed.")
+    parser.add_argument("--output", default="slow_queries.json", help="JSON report path.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        copy = os.path.join(folder, os.path.basename(args.db))
+        copy_db(args.db, copy)
+        migrate(copy)
+        bench = Bench.from_db(copy, repeat=args.repeat, seed=args.seed)
+        # Nothing runs yet: reopen the migration connections with the profiler.
+        connection.close_all()
+        profiler = enable(args.threshold_ms)
+        try:
+            bench.run()
+        finally:
+            disable()
+
+    print()
+    print(profiler.format_report(args.limit))
+    output = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "db": os.path.abspath(args.db),
+        "sqlite": sqlite3.sqlite_version,
+        "threshold_ms": args.threshold_ms,
+        "statements": profiler.report(),
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(output, file, indent=2)
+    print(f"Report written to {args.output}")
@@ -0,0 +1,94 @@
+"""Monthly Log archives: the move to the month files and the reads across them."""
+
+import os
+import sqlite3
+
+import pytest
+
+import connection
+from archive import LogArchive
+from issa import LogTable
+from migrations import migrate
+
+COLUMNS = ["type", "desc", "serial_number", "created_on"]
+OLD = "2025-01-10 10:00:00"
+
+
+@pytest.fixture
+def log(tmp_path):
+    db_file = str(tmp_path / "issa.db")
+    migrate(db_file)
+    table = LogTable(db_file=db_file)
+    table.insert_many("Log", [("info", f"old {i}", "S1" if i % 3 else "S2", OLD) for i in range(15)], COLUMNS)
+    table.insert_many("Log", [("info", f"new {i}", "S1") for i in range(4)], ["type", "desc", "serial_number"])
+    yield table
+    connection.get_manager(db_file).close_all()
+
+
+@pytest.fixture
+def log_archive(log, tmp_path):
+    return LogArchive(log, archive_dir=str(tmp_path / "archive"), retention_days=30)
+
+
+def count(table, query="SELECT count(*) FROM Log;"):
+    return table.fetch(query)[0][0]
+
+
+def archived_rows(log_archive):
+    path, = log_archive.partitions("S1")
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT id, desc FROM Log ORDER BY id;").fetchall()
+    finally:
+        conn.close()
+
+
+def descs(rows):
+    return [row[2] for row in rows]
+
+
+def test_archive_moves_one_month(log, log_archive):
+    assert log_archive.archive() == 15
+    assert count(log) == 4
+    assert count(log, "SELECT count(*) FROM Log WHERE created_on < '2025-02-01';") == 0
+    assert len(archived_rows(log_archive)) == 15
+    assert log.fetch("SELECT month, rows FROM Log_Partition;") == [("2025-01", 15)]
+    assert log.fetch("SELECT serial_number FROM Log_Archive ORDER BY 1;") == [("S1",), ("S2",)]
+    assert os.path.isabs(log.fetch("SELECT file FROM Log_Partition;")[0][0])
+
+
+def test_reads_return_archived_then_hot_rows(log, log_archive):
+    before = descs(log.get_logs_by_serial_number("S1"))
+    log_archive.archive()
+    expected = [f"old {i}" for i in range(15) if i % 3] + [f"new {i}" for i in range(4)]
+    assert before == expected
+    assert descs(log.get_logs_by_serial_number("S1")) == expected
+    assert descs(row for rows in log.iter_logs_by_serial_number("S1", chunk_size=3) for row in rows) == expected
+    assert descs(row for rows in log.iter_logs(["S1"], chunk_size=3) for row in rows) == expected
+
+
+def test_second_run_does_not_duplicate(log, log_archive):
+    log_archive.archive()
+    assert log_archive.archive() == 0
+
+    # A late line of the archived month, and a row already copied by an interrupted run.
+    log.insert_many("Log", [("info", "late", "S2", OLD)], COLUMNS)
+    copied = archived_rows(log_archive)[0]
+    log.insert_many("Log", [dict(id=copied[0], type="info", desc=copied[1], serial_number="S2", created_on=OLD)])
+    assert log_archive.archive() == 2
+
+    rows = archived_rows(log_archive)
+    assert len(rows) == 16
+    assert len({row_id for row_id, _ in rows}) == 16
+    assert count(log) == 4
+    assert descs(log.get_logs_by_serial_number("S2")).count(copied[1]) == 1
+
+
+def test_drop_clears_the_archives(log, log_archive):
+    log_archive.archive()
+    path, = log_archive.partitions("S1")
+    log.drop()
+    migrate(log.db_file, reset=True)
+    assert not os.path.exists(path)
+    assert count(log, "SELECT count(*) FROM Log_Partition;") == 0
+    assert log.get_logs_by_serial_number("S1") == []
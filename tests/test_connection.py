@@ -0,0 +1,202 @@
+"""Sessions, transactions and savepoints of the connection manager."""
+
+import sqlite3
+
+import pytest
+
+from connection import ConnectionManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    db_file = str(tmp_path / "issa.db")
+    manager = ConnectionManager(db_file)
+    with manager.transaction() as conn:
+        conn.execute("CREATE TABLE Item(name TEXT NOT NULL UNIQUE);")
+    yield manager
+    manager.close_all()
+
+
+def insert(manager, name):
+    with manager.transaction() as conn:
+        conn.execute("INSERT INTO Item(name) VALUES (?);", (name,))
+
+
+def committed(manager):
+    """Item names seen by another connection."""
+    conn = sqlite3.connect(manager.db_file)
+    try:
+        return sorted(name for name, in conn.execute("SELECT name FROM Item;"))
+    finally:
+        conn.close()
+
+
+def test_transaction_commits(manager):
+    insert(manager, "a")
+    assert committed(manager) == ["a"]
+
+
+def test_transaction_rolls_back_on_error(manager):
+    with pytest.raises(ValueError):
+        with manager.transaction() as conn:
+            conn.execute("INSERT INTO Item(name) VALUES ('a');")
+            raise ValueError()
+    assert committed(manager) == []
+    assert not manager.connection().in_transaction
+
+
+def test_nested_sessions_commit_once(manager):
+    with manager.session():
+        insert(manager, "a")
+        with manager.session():
+            insert(manager, "b")
+        assert committed(manager) == []
+        assert manager.in_session
+    assert committed(manager) == ["a", "b"]
+    assert not manager.in_session
+
+
+def test_session_rolls_back_everything(manager):
+    with pytest.raises(ValueError):
+        with manager.session():
+            insert(manager, "a")
+            with manager.session():
+                insert(manager, "b")
+            raise ValueError()
+    assert committed(manager) == []
+    assert not manager.in_session
+
+
+def test_failed_transaction_only_discards_its_savepoint(manager):
+    with manager.session():
+        insert(manager, "a")
+        with pytest.raises(sqlite3.IntegrityError):
+            with manager.transaction() as conn:
+                conn.execute("INSERT INTO Item(name) VALUES ('b');")
+                conn.execute("INSERT INTO Item(name) VALUES ('a');")
+        insert(manager, "c")
+    assert committed(manager) == ["a", "c"]
+
+
+def test_savepoint_names_are_replayed(manager):
+    with manager.session() as conn:
+        for name in ("a", "b", "c"):
+            with pytest.raises(ValueError):
+                with manager.transaction():
+                    insert(manager, name + "-discarded")
+                    raise ValueError()
+            with manager.transaction():
+                with manager.transaction():
+                    insert(manager, name)
+        assert manager._local.savepoints == 0
+        assert conn.in_transaction
+    assert committed(manager) == ["a", "b", "c"]
+
+
+def test_nested_savepoint_rollback(manager):
+    with manager.session():
+        with manager.transaction():
+            insert(manager, "a")
+            with pytest.raises(ValueError):
+                with manager.transaction():
+                    insert(manager, "b")
+                    raise ValueError()
+            insert(manager, "c")
+    assert committed(manager) == ["a", "c"]
+
+
+def test_nested_transaction_rolls_back_with_the_outer_one(manager):
+    with pytest.raises(ValueError):
+        with manager.transaction():
+            insert(manager, "a")
+            with manager.transaction():
+                insert(manager, "b")
+            assert committed(manager) == []
+            raise ValueError()
+    assert committed(manager) == []
+    assert not manager.connection().in_transaction
+
+
+def test_nested_transaction_failure_keeps_the_outer_one(manager):
+    with manager.transaction():
+        insert(manager, "a")
+        with pytest.raises(ValueError):
+            with manager.transaction():
+                insert(manager, "b")
+                raise ValueError()
+        insert(manager, "c")
+    assert committed(manager) == ["a", "c"]
+
+
+def test_session_inside_a_transaction_does_not_commit(manager):
+    with pytest.raises(ValueError):
+        with manager.transaction():
+            with manager.session():
+                insert(manager, "a")
+            assert committed(manager) == []
+            assert not manager.in_session
+            raise ValueError()
+    assert committed(manager) == []
+
+
+def test_table_writes_roll_back_with_an_enclosing_transaction(tmp_path):
+    from issa import ProductTable, ProductTestTable, TestTable
+
+    db_file = str(tmp_path / "issa.db")
+    for table in (ProductTable, TestTable, ProductTestTable):
+        table(db_file=db_file).create()
+    product = ProductTable(db_file=db_file)
+    with pytest.raises(ValueError):
+        with product.manager.transaction():
+            product.insert_many("Product", [("S1", "unit", "type")], ["serial_number", "desc", "type"])
+            ProductTestTable(db_file=db_file).insert_product_test("S1", [("did a", "numeric", "0", "1", "V", "1")])
+            raise ValueError()
+    assert product.fetch("SELECT count(*) FROM Product;") == [(0,)]
+    assert product.fetch("SELECT count(*) FROM Product_Test;") == [(0,)]
+
+
+def test_reader_sees_session_writes(manager):
+    with manager.session():
+        insert(manager, "a")
+        with manager.reader() as conn:
+            assert conn.execute("SELECT count(*) FROM Item;").fetchone()[0] == 1
+    with manager.reader() as conn:
+        assert conn is not manager.connection()
+
+
+def test_after_commit_hooks(manager):
+    calls = []
+    with manager.session():
+        insert(manager, "a")
+        manager.after_commit(lambda: calls.append("committed"))
+        assert calls == []
+    assert calls == ["committed"]
+
+    with pytest.raises(ValueError):
+        with manager.session():
+            insert(manager, "b")
+            manager.after_commit(lambda: calls.append("rolled back"))
+            raise ValueError()
+    assert calls == ["committed"]
+
+
+def test_close_all_reopens(manager):
+    insert(manager, "a")
+    first = manager.connection()
+    manager.close_all()
+    assert manager.connection() is not first
+    insert(manager, "b")
+    assert committed(manager) == ["a", "b"]
+
+
+def test_create_is_refused_inside_a_session(tmp_path):
+    from issa import ProductTable
+
+    table = ProductTable(db_file=str(tmp_path / "issa.db"))
+    table.create()
+    with table.session():
+        table.insert_many("Product", [("S1", "unit", "type")], ["serial_number", "desc", "type"])
+        with pytest.raises(RuntimeError):
+            table.create()
+        assert table.manager.connection().in_transaction
+    assert table.fetch("SELECT serial_number FROM Product;") == [("S1",)]
@@ -0,0 +1,74 @@
+"""Bulk inserts and lookup caches of the ISSA tables."""
+
+import sqlite3
+
+import pytest
+
+import connection
+import issa
+from issa import InsertResult, ProductTable, ProductTestTable
+from migrations import migrate
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    db_file = str(tmp_path / "issa.db")
+    migrate(db_file)
+    yield db_file
+    connection.get_manager(db_file).close_all()
+
+
+def serials(table):
+    return [serial for serial, in table.fetch("SELECT serial_number FROM Product ORDER BY serial_number;")]
+
+
+def test_insert_many_rejects_only_the_duplicate(db_file):
+    product = ProductTable(db_file=db_file)
+    rows = [("S1", "unit", "A"), ("S2", "unit", "A"), ("S1", "again", "A"), ("S3", "unit", "A")]
+    result = product.insert_many("Product", rows, ["serial_number", "desc", "type"])
+    assert result == InsertResult(3, 1)
+    assert serials(product) == ["S1", "S2", "S3"]
+    assert product.fetch("SELECT desc FROM Product WHERE serial_number = 'S1';") == [("unit",)]
+
+
+def test_insert_many_replay_keeps_the_session(db_file):
+    product = ProductTable(db_file=db_file)
+    columns = ["serial_number", "desc", "type"]
+    with product.session() as conn:
+        product.insert_many("Product", [("S0", "unit", "A")], columns)
+        result = product.insert_many("Product", [("S1", "unit", "A"), ("S0", "dup", "A"), ("S2", "unit", "A")],
+                                     columns)
+        assert result == InsertResult(2, 1)
+        assert conn.in_transaction
+        product.insert_many("Product", [("S3", "unit", "A")], columns)
+    assert serials(product) == ["S0", "S1", "S2", "S3"]
+
+
+def test_insert_many_counts_every_column_shape(db_file):
+    product = ProductTable(db_file=db_file)
+    rows = [{"serial_number": "S1"}, {"serial_number": "S2", "type": "A"}, {"serial_number": "S1", "type": "B"}]
+    assert product.insert_many("Product", rows) == InsertResult(2, 1)
+    assert serials(product) == ["S1", "S2"]
+
+
+def test_test_ids_follow_a_table_created_again_elsewhere(db_file):
+    results = ProductTestTable(db_file=db_file)
+    assert results.insert_product_test("S1", [("did a", "numeric", "0", "1", "V", "1")]).inserted == 1
+    assert issa.TestTable(db_file=db_file).get_id("did a") == 1
+
+    # Another process initialises the DB again while the cache of this one is warm.
+    other = sqlite3.connect(db_file)
+    with other:
+        create_sql, = other.execute("SELECT sql FROM sqlite_master WHERE name = 'Test';").fetchone()
+        other.execute("DROP TABLE Test;")
+        other.execute(create_sql)
+        other.execute("INSERT INTO Test(id, name, type, min_limit, units, category) "
+                      "VALUES (1, 'other', 'numeric', '0', 'V', 'general');")
+    other.close()
+
+    assert results.insert_product_test("S2", [("did a", "numeric", "0", "1", "V", "1")]).inserted == 1
+    assert results.fetch("SELECT t.name FROM Product_Test pt JOIN Test t ON t.id = pt.test_id "
+                         "WHERE pt.serial_number = 'S2';") == [("did a",)]
+    assert ProductTable(db_file=db_file).get_product_dids("S2")
+    assert issa.TestTable(db_file=db_file).get_id("other") == 1
+    assert issa.TestTable(db_file=db_file).get_id("did a") == 2
@@ -0,0 +1,108 @@
+"""Shift, day and date range windows of the time-window reports.
+
+Windows are given in station local time and converted to the UTC
+'YYYY-MM-DD HH:MM:SS' strings stored in created_on.
+
+    python time_windows.py --shift early --day 2026-10-17
+    python time_windows.py --start "2026-10-01 00:00" --end "2026-10-08 00:00"
+"""
+
+import argparse
+from datetime import date, datetime, time, timedelta, timezone
+
+# Shift name -> (start, end) local time, a shift ending before it starts ends the next day.
+SHIFTS = {
+    "early": (time(6), time(14)),
+    "late": (time(14), time(22)),
+    "night": (time(22), time(6)),
+}
+
+
+def to_utc(moment: datetime) -> str:
+    """
+    Converts a local time to the UTC format of created_on.
+
+    Parameters
+        moment (datetime): Local time, naive or aware.
+
+    Returns
+        timestamp (str): 'YYYY-MM-DD HH:MM:SS' UTC.
+    """
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def range_window(start: datetime, end: datetime) -> tuple:
+    """
+    Gets the created_on window of a local date range.
+
+    Parameters
+        start   (datetime): First local time.
+        end     (datetime): End local time, excluded.
+
+    Returns
+        (start, end) (tuple): UTC timestamps.
+    """
+    return to_utc(start), to_utc(end)
+
+
+def day_window(day: date = None) -> tuple:
+    """
+    Gets the created_on window of a local day.
+
+    Parameters
+        day (date): Day, today if None.
+
+    Returns
+        (start, end) (tuple): UTC timestamps.
+    """
+    day = day or date.today()
+    start = datetime.combine(day, time())
+    return range_window(start, start + timedelta(days=1))
+
+
+def shift_window(shift: str, day: date = None) -> tuple:
+    """
+    Gets the created_on window of a shift.
+
+    Parameters
+        shift   (str): Shift name, see SHIFTS.
+        day     (date): Day the shift starts, today if None.
+
+    Returns
+        (start, end) (tuple): UTC timestamps.
+    """
+    if shift not in SHIFTS:
+        raise ValueError(f"Unknown shift: {shift}")
+    day = day or date.today()
+    first, last = SHIFTS[shift]
+    start = datetime.combine(day, first)
+    end = datetime.combine(day, last)
+    if end <= start:
+        end += timedelta(days=1)
+    return range_window(start, end)
+
+
+if "__main__" == __name__:
+    from report import Report
+
+    parser = argparse.ArgumentParser(description="Write the benchmarks, logs and test results of a time window.")
+    parser.add_argument("--day", type=date.fromisoformat, default=None, help="YYYY-MM-DD, today by default.")
+    parser.add_argument("--shift", choices=sorted(SHIFTS), help="Shift of the day.")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Local start, 'YYYY-MM-DD HH:MM'.")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Local end, excluded.")
+    args = parser.parse_args()
+
+    day = args.day or date.today()
+    if args.start and args.end:
+        window = range_window(args.start, args.end)
+        name = f"{args.start:%y%m%d%H%M}-{args.end:%y%m%d%H%M}"
+    elif args.shift:
+        window = shift_window(args.shift, day)
+        name = f"{day:%y%m%d}_{args.shift}"
+    else:
+        window = day_window(day)
+        name = f"{day:%y%m%d}"
+    report = Report()
+    path = f"{report.base_path}/{name}_Window.xlsx"
+    rows = report.write_time_window(*window, path=path)
+    print(f"{rows} rows written to {path}")
@@ -1,40 +1,95 @@
 """User Interface for iSSA."""
 
 
-from tkinter import Tk, Label, W, StringVar, Entry, Button
-from tkinter.ttk import Combobox
+import itertools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import Tk, Label, W, EW, END, StringVar, Entry, Button, Listbox
+from tkinter.ttk import Combobox, Progressbar
 
 from report import Report
 from issa import ProductTable
 
 FONT = ("Arial", 16, "normal")
+POLL_MS = 100
+
+REPORTS = {
+    "benchmark": ("Benchmark", "write_product_benchmark"),
+    "log": ("Log", "write_log_test"),
+    "dids report": ("DIDs report", "write_dids_report"),
+}
+
+
+class ReportCancelled(Exception):
+    """Raised from the progress callback of a cancelled report."""
+
+
+class ReportJob:
+    """
+    A class to represent a report queued from the UI.
+
+    Attributes:
+        job_id          (int): Job number, in submission order.
+        name            (str): Report name, e.g. Benchmark.
+        method          (str): Report method writing the file.
+        serial_number   (str): Serial number, the last product if empty.
+        path            (str): Written report, set by the worker.
+        cancelled       (Event): Set to cancel the job.
+        future          (Future): Job of the worker pool.
+    """
+    def __init__(self, job_id: int, name: str, method: str, serial_number: str) -> None:
+        self.job_id = job_id
+        self.name = name
+        self.method = method
+        self.serial_number = serial_number
+        self.path = None
+        self.cancelled = threading.Event()
+        self.future = None
+
+
+    def __str__(self) -> str:
+        return f"#{self.job_id} {self.name} {self.serial_number or '(last product)'}"
+
 
 class ISSAInterface:
     """
     A class to represent the iSSA User Interface.
 
+    Reports are written by a pool of worker threads, so the window stays responsive.
+    Workers post their progress and results to a queue that the Tk main loop polls
+    with after(), widgets are only ever touched from the main thread. The window is
+    drawn before any DB query, the last serial number is filled in by a worker.
+
     Attributes:
         window
-        att2
+        workers (int): Reports written at the same time.
+        jobs    (dict): job_id -> ReportJob of the queued and running reports.
+        events  (Queue): (kind, job, value) messages posted by the workers.
     """
-    def __init__(self) -> None:
+    def __init__(self, workers: int = 2) -> None:
         self.window = Tk()
         self.window.title("iSSA")
-        self.window.geometry('480x200')
+        self.window.geometry('480x420')
         self.window.config(padx=20, pady=40)
-        self.last_serial_number = self.get_last_serial_number()
+        self.last_serial_number = None
+
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="issa-report")
+        self.jobs = {}
+        self.events = queue.Queue()
+        self.job_ids = itertools.count(1)
 
         #Labels
         self.sn_label = Label(text="Serial Number", font=FONT)
         self.sn_label.grid(sticky=W, column=0, row=0)
 
         self.stauts_label = Label(text="", font=("Arial", 14))
-        self.stauts_label.grid(sticky=W, column=0, row=3)
+        self.stauts_label.grid(sticky=W, column=0, row=3, columnspan=2)
 
         # Input
-        text = StringVar()
-        text.set(self.last_serial_number)
-        self.report_input = Entry(width=18, font=FONT, textvariable=text)
+        self.serial_number = StringVar()
+        self.report_input = Entry(width=18, font=FONT, textvariable=self.serial_number)
         self.report_input.grid(sticky=W, column=0, row=1)
 
         # Combobox
@@ -53,6 +108,23 @@ class ISSAInterface:
             command=self.generate_report)
         self.report_button.grid(column=1, row=1, rowspan=2, padx=15)
 
+        # Progress
+        self.progress_bar = Progressbar(mode="indeterminate", length=300)
+        self.progress_bar.grid(sticky=EW, column=0, row=4, columnspan=2, pady=5)
+
+        self.jobs_list = Listbox(height=5, font=("Arial", 12), selectmode="extended")
+        self.jobs_list.grid(sticky=EW, column=0, row=5, columnspan=2)
+
+        self.cancel_button = Button(
+            text="Cancel",
+            font=("Arial", 12),
+            command=self.cancel_reports)
+        self.cancel_button.grid(sticky=W, column=0, row=6, pady=5)
+
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.window.after(POLL_MS, self.poll_events)
+        self.pool.submit(self.load_last_serial_number)
+
         # Main loop
         self.window.mainloop()
 
@@ -65,33 +137,123 @@ class ISSAInterface:
             serial_number (str): Latest product serial number.
         """
         product = ProductTable()
-        return product.get_last_row()[0]
+        last_row = product.get_last_row()
+        return last_row[0] if last_row else ""
+
+
+    def load_last_serial_number(self) -> None:
+        """Gets the last serial number in a worker thread, see poll_events."""
+        self.events.put(("last_serial", None, self.get_last_serial_number()))
 
 
     def generate_report(self):
-        """Generate selected report."""
-        report = Report()
-        serial_number = self.report_input.get()
-        selected_option = self.options_box.get()
-
-        if selected_option.lower() == "benchmark":
-            if serial_number:
-                report.write_product_benchmark(serial_number)
-                self.stauts_label.config(text="Benchmark successfully created!")
-            else:
-                report.write_last_product_benchmark()
-
-        elif selected_option.lower() == "log":
-            if serial_number:
-                report.write_log_test(serial_number)
-                self.stauts_label.config(text="Log successfully created!")
-            else:
-                report.write_log_test_last_product()
-
-        elif selected_option.lower() == "dids report":
-            if serial_number:
-                report.write_dids_report(serial_number)
-                self.stauts_label.config(text="DIDs report successfully created!")
+        """Queue selected report, it is written in the background."""
+        serial_number = self.report_input.get().strip()
+        selected_option = self.options_box.get().lower()
+        if selected_option not in REPORTS:
+            self.stauts_label.config(text=f"Unknown report: {self.options_box.get()}")
+            return
+
+        name, method = REPORTS[selected_option]
+        # Both jobs would write the same file.
+        for queued in self.jobs.values():
+            if (queued.method, queued.serial_number) == (method, serial_number):
+                self.stauts_label.config(text=f"{queued} is already queued")
+                return
+        job = ReportJob(next(self.job_ids), name, method, serial_number)
+        self.jobs[job.job_id] = job
+        job.future = self.pool.submit(self.run_report, job)
+        self.refresh_jobs()
+
+
+    def run_report(self, job: ReportJob) -> None:
+        """
+        Writes the report of a job, runs in a worker thread.
+
+        Parameters
+            job (ReportJob): Queued report.
+
+        Returns
+            None
+        """
+        def progress(rows: int) -> None:
+            if job.cancelled.is_set():
+                raise ReportCancelled()
+            self.events.put(("progress", job, rows))
+
+        try:
+            if job.cancelled.is_set():
+                raise ReportCancelled()
+            self.events.put(("started", job, None))
+            serial_number = job.serial_number or self.get_last_serial_number()
+            report = Report(streaming=True, progress=progress)
+            job.path = report.dated_path(serial_number, job.name.replace(" ", "_"))
+            getattr(report, job.method)(serial_number, path=job.path)
+            self.events.put(("done", job, job.path))
+        except ReportCancelled:
+            self.events.put(("cancelled", job, None))
+        except Exception as err:  # pylint: disable=broad-except
+            self.events.put(("failed", job, err))
+
+
+    def poll_events(self) -> None:
+        """Applies the messages of the workers to the widgets, every POLL_MS."""
+        try:
+            while True:
+                kind, job, value = self.events.get_nowait()
+                if kind == "last_serial":
+                    self.last_serial_number = value
+                    # Keep what the operator typed meanwhile.
+                    if not self.serial_number.get():
+                        self.serial_number.set(value)
+                elif kind == "progress":
+                    self.stauts_label.config(text=f"{job}: {value} rows")
+                elif kind == "started":
+                    self.stauts_label.config(text=f"{job} started")
+                else:
+                    self.jobs.pop(job.job_id, None)
+                    if kind == "done":
+                        self.stauts_label.config(text=f"{value} successfully created!")
+                    elif kind == "cancelled":
+                        self.stauts_label.config(text=f"{job} cancelled")
+                    else:
+                        self.stauts_label.config(text=f"{job} failed: {value}")
+                    self.refresh_jobs()
+        except queue.Empty:
+            pass
+        self.window.after(POLL_MS, self.poll_events)
+
+
+    def refresh_jobs(self) -> None:
+        """Lists the queued and running reports and animates the progress bar."""
+        self.jobs_list.delete(0, END)
+        for job in self.jobs.values():
+            self.jobs_list.insert(END, str(job))
+        if self.jobs:
+            self.progress_bar.start(20)
+        else:
+            self.progress_bar.stop()
+
+
+    def cancel_reports(self) -> None:
+        """Cancels the selected reports, every report if none is selected."""
+        jobs = list(self.jobs.values())
+        selection = self.jobs_list.curselection()
+        if selection:
+            jobs = [jobs[index] for index in selection if index < len(jobs)]
+        for job in jobs:
+            job.cancelled.set()
+            if job.future.cancel():
+                # Never started, no worker will report it.
+                self.events.put(("cancelled", job, None))
+
+
+    def close(self) -> None:
+        """Cancels every report and closes the window."""
+        for job in self.jobs.values():
+            job.cancelled.set()
+        self.pool.shutdown(wait=False)
+        self.window.destroy()
 
 
 if "__main__" == __name__: